@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, SRC_DIR)
+
+from synthetic_project import generate_project
+from utils.api import ArchiveOptions, archive_project
+from utils.archive_backends import BACKENDS
+
+RESULT_VERSION = 1
+
+# Imports the command line entry point in a new interpreter, like a headless run does before it starts working
+STARTUP_SCRIPT = '''
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import main
+print(json.dumps({{"import_time": time.perf_counter() - start,
+                  "gui_loaded": any(name in sys.modules for name in ("tkinter", "_tkinter", "ui.hmi")),
+                  "chardet_loaded": "chardet" in sys.modules}}))
+'''
+
+# Project sizes selectable with --size, every value can be overridden on the command line
+SIZES = {
+    'small': dict(technology_packages=3, configurations=2, modules=50, module_types=10, external_modules=1,
+                  logical_files=200, logical_file_size=4096, binary_files=5, binary_file_size=65536, upgrade_size=65536),
+    'medium': dict(technology_packages=8, configurations=8, modules=300, module_types=40, external_modules=2,
+                   logical_files=2000, logical_file_size=8192, binary_files=20, binary_file_size=262144, upgrade_size=262144),
+    'large': dict(technology_packages=15, configurations=24, modules=1000, module_types=120, external_modules=4,
+                  logical_files=10000, logical_file_size=8192, binary_files=50, binary_file_size=1048576, upgrade_size=1048576),
+}
+
+def run_once(project, options):
+    """
+    Zip the project once.
+
+    Args:
+        project (SyntheticProject): The generated project.
+        options (ArchiveOptions): Options of the job.
+
+    Returns:
+        dict: Wall time, phase timings, sizes and, with profiling, the metrics per phase.
+    """
+    start = time.perf_counter()
+    result = archive_project(project.project_dir, options)
+    wall_time = time.perf_counter() - start
+    run = {
+        'wall_time': round(wall_time, 6),
+        'phases': {name: round(duration, 6) for name, duration in result.timings.items()},
+        'files': len(result.members),
+        'bytes_in': result.bytes_in,
+        'bytes_out': result.bytes_out,
+        'ratio': round(result.ratio, 4),
+        'missing_upgrades': len(result.missing_upgrades),
+    }
+    profile_file = project.project_dir + '_profile.json'
+    if options.profile and os.path.exists(profile_file):
+        with open(profile_file, 'r', encoding='utf-8') as file:
+            run['profile'] = json.load(file)['phases']
+    return run
+
+def measure_startup(repeat):
+    """
+    Measure the time from starting a new interpreter until the headless entry point is ready.
+
+    Args:
+        repeat (int): Number of measurements, the median is reported.
+
+    Returns:
+        dict: Interpreter start time, import time of main.py, time to first work in seconds
+        and whether the GUI stack or chardet were loaded.
+    """
+    def spawn(*args):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True).stdout
+        return time.perf_counter() - start, output
+
+    interpreter = statistics.median(spawn('-c', 'pass')[0] for _ in range(repeat))
+    runs = [spawn('-c', STARTUP_SCRIPT.format(src=SRC_DIR)) for _ in range(repeat)]
+    imports = [json.loads(output) for _, output in runs]
+    return {
+        'interpreter': round(interpreter, 6),
+        'import_main': round(statistics.median(result['import_time'] for result in imports), 6),
+        'time_to_first_work': round(statistics.median(duration for duration, _ in runs), 6),
+        'gui_loaded': any(result['gui_loaded'] for result in imports),
+        'chardet_loaded': any(result['chardet_loaded'] for result in imports),
+    }
+
+def summarize(runs):
+    """
+    Get the cold run and the medians of the warm runs.
+
+    Args:
+        runs (list): Results of run_once(), the first run is the cold run.
+
+    Returns:
+        dict: Wall time of the cold run, median wall time and median phase timings of the warm runs.
+    """
+    warm = runs[1:] or runs
+    phases = {name: round(statistics.median(run['phases'].get(name, 0) for run in warm), 6) for name in warm[0]['phases']}
+    return {
+        'cold_wall_time': runs[0]['wall_time'],
+        'warm_wall_time': round(statistics.median(run['wall_time'] for run in warm), 6),
+        'warm_phases': phases,
+        'throughput_mb_s': round(runs[-1]['bytes_in'] / 1024 / 1024 / statistics.median(run['wall_time'] for run in warm), 3),
+    }
+
+def run_format(project, options, repeat):
+    """
+    Run the cold run and the warm runs with one archive format.
+
+    Args:
+        project (SyntheticProject): The generated project.
+        options (ArchiveOptions): Options of the job, with the archive format and level set.
+        repeat (int): Number of warm runs.
+
+    Returns:
+        tuple: (runs, format summary with level, summary, archive size and ratio)
+    """
+    runs = [run_once(project, options) for _ in range(repeat + 1)]
+    backend = BACKENDS[options.archive_format]
+    return runs, {
+        'level': backend.default_level if options.level is None else options.level,
+        'summary': summarize(runs),
+        'bytes_out': runs[-1]['bytes_out'],
+        'ratio': runs[-1]['ratio'],
+    }
+
+def compare(results, baseline_file):
+    """
+    Print the change of the summary values against an earlier result file.
+
+    Args:
+        results (dict): The current results.
+        baseline_file (str): Path of the earlier results.
+    """
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline.get('parameters') != results['parameters']:
+        print("Warning: the baseline was run with different parameters")
+
+    def values(summary):
+        yield 'cold_wall_time', summary['cold_wall_time']
+        yield 'warm_wall_time', summary['warm_wall_time']
+        if 'time_to_first_work' in summary:
+            yield 'time_to_first_work', summary['time_to_first_work']
+        for name, duration in summary['warm_phases'].items():
+            yield f'warm_phases.{name}', duration
+
+    old = dict(values(baseline['summary']))
+    print(f"{'value':<32}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, value in values(results['summary']):
+        if name in old:
+            change = f"{(value / old[name] - 1) * 100:+.1f}%" if old[name] else '-'
+            print(f"{name:<32}{old[name]:>12.4f}{value:>12.4f}{change:>10}")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark BrPyZip on a generated Automation Studio project")
+    parser.add_argument("--size", choices=sorted(SIZES), default='medium', help="Size of the generated project")
+    for name, value in SIZES['medium'].items():
+        parser.add_argument(f"--{name}", type=int, help=f"Override the {name.replace('_', ' ')} of the size")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the generated content")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of parallel compression jobs, 0 uses all CPU cores")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of warm runs after the cold run")
+    parser.add_argument("--formats", default='zip', help=f"Comma separated archive formats to compare, of {', '.join(BACKENDS)}")
+    parser.add_argument("--level", type=int, help="Compression level of all formats, the default of each format if not set")
+    parser.add_argument("--profile", action="store_true", help="Collect the file system metrics per phase")
+    parser.add_argument("--startup_repeat", type=int, default=5, help="Number of startup measurements, 0 skips them")
+    parser.add_argument("--directory", help="Directory for the generated project, a temporary directory by default")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated project")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with an earlier JSON file")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    parameters = dict(SIZES[args.size])
+    for name in parameters:
+        if getattr(args, name) is not None:
+            parameters[name] = getattr(args, name)
+    parameters['seed'] = args.seed
+
+    base_dir = args.directory or tempfile.mkdtemp(prefix='brpyzip_benchmark_')
+    try:
+        start = time.perf_counter()
+        project = generate_project(base_dir, **parameters)
+        generate_time = time.perf_counter() - start
+
+        runs = None
+        formats = {}
+        for name in [name.strip() for name in args.formats.split(',') if name.strip()]:
+            options = ArchiveOptions(as_paths=project.as_paths, translate=project.translate, jobs=args.jobs,
+                                     cache_directory=os.path.join(base_dir, 'cache'), profile=args.profile,
+                                     archive_format=name, level=args.level)
+            try:
+                format_runs, formats[name] = run_format(project, options, args.repeat)
+            except Exception as e:
+                print(f"Skipped format {name}: {e}")
+                continue
+            # The runs of the first format are the main result, compared with --compare
+            runs = runs or format_runs
+        if runs is None:
+            raise SystemExit("No archive format could be benchmarked")
+
+        results = {
+            'version': RESULT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'size': args.size,
+            'parameters': parameters,
+            'jobs': args.jobs,
+            'generate_time': round(generate_time, 3),
+            'runs': runs,
+            'summary': summarize(runs),
+            'formats': formats,
+        }
+        if args.startup_repeat > 0:
+            results['startup'] = measure_startup(args.startup_repeat)
+            results['summary']['time_to_first_work'] = results['startup']['time_to_first_work']
+    finally:
+        if not args.keep and not args.directory:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    summary = results['summary']
+    print(f"{args.size} project, {runs[0]['files']} files, {runs[0]['bytes_in'] / 1024 / 1024:.1f} MB, jobs {args.jobs}")
+    print(f"cold {summary['cold_wall_time']:.3f} s, warm {summary['warm_wall_time']:.3f} s, {summary['throughput_mb_s']:.1f} MB/s")
+    for name, duration in summary['warm_phases'].items():
+        print(f"  {name:<16}{duration:.4f} s")
+    if len(formats) > 1:
+        print(f"{'format':<8}{'level':>6}{'warm s':>10}{'MB/s':>10}{'size MB':>10}{'ratio':>8}")
+        for name, result in formats.items():
+            print(f"{name:<8}{result['level']:>6}{result['summary']['warm_wall_time']:>10.3f}{result['summary']['throughput_mb_s']:>10.1f}"
+                  f"{result['bytes_out'] / 1024 / 1024:>10.2f}{result['ratio']:>8.3f}")
+    if 'startup' in results:
+        startup = results['startup']
+        print(f"time to first work {startup['time_to_first_work']:.3f} s (interpreter {startup['interpreter']:.3f} s, import {startup['import_main']:.3f} s), "
+              f"GUI loaded {startup['gui_loaded']}, chardet loaded {startup['chardet_loaded']}")
+    if args.keep or args.directory:
+        print(f"Project kept in {base_dir}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
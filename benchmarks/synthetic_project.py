@@ -0,0 +1,141 @@
+import os
+import random
+from collections import namedtuple
+
+AS_VERSION = '4_12'
+RUNTIME_VERSION = 'B4.93'
+# Runtime version as used in the upgrade file name
+RUNTIME_FILE_VERSION = 'B0493'
+VC_VERSION = '4.12.5'
+CPU_TYPE = 'X20CP0484-1'
+CPU_SUBSTITUTE = 'X20CP04xx'
+
+# Paths of a generated project and the settings needed to zip it
+SyntheticProject = namedtuple('SyntheticProject', ['base_dir', 'project_dir', 'apj_file', 'as_paths', 'translate'])
+
+# Words used for the generated source files, so they compress like real code
+WORDS = ['PROGRAM', '_CYCLIC', 'END_PROGRAM', 'VAR', 'END_VAR', 'IF', 'THEN', 'ELSE', 'END_IF', 'FOR', 'TO', 'DO',
+         'END_FOR', ':=', 'TRUE', 'FALSE', 'BOOL', 'INT', 'REAL', 'STRING', 'Axis', 'Motor', 'Speed', 'Position',
+         'Enable', 'Error', 'State', 'Step', 'Timer', 'Counter', 'Input', 'Output', 'Value', 'Config', ';']
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb' if isinstance(data, bytes) else 'w', **({} if isinstance(data, bytes) else {'encoding': 'utf-8'})) as file:
+        file.write(data)
+
+def _source_text(rng, size):
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+def generate_project(base_dir, technology_packages=5, configurations=4, modules=100, module_types=20,
+                     external_modules=2, logical_files=500, logical_file_size=8192, binary_files=20,
+                     binary_file_size=262144, upgrade_size=262144, seed=1):
+    """
+    Generate a synthetic Automation Studio project with a fake installation.
+
+    The project has an .apj file with technology packages, Physical configurations
+    with Cpu.pkg, Hardware.hw and ExternalHardwareDevices.xml and a Logical tree with
+    source and binary files. Next to it an Automation Studio installation with
+    Upgrades and external hardware modules is generated, holding a dummy upgrade for
+    every technology package, runtime, VC and module type used by the project.
+
+    Args:
+        base_dir (str): Directory the project and the installation are generated in.
+        technology_packages (int): Number of technology packages in the .apj file.
+        configurations (int): Number of configurations in Physical.
+        modules (int): Number of modules in each Hardware.hw.
+        module_types (int): Number of distinct module types.
+        external_modules (int): Number of external modules per configuration.
+        logical_files (int): Number of source files in Logical.
+        logical_file_size (int): Size of each source file in bytes.
+        binary_files (int): Number of incompressible binary files in Logical.
+        binary_file_size (int): Size of each binary file in bytes.
+        upgrade_size (int): Size of each dummy upgrade file in bytes.
+        seed (int): Seed of the generated content.
+
+    Returns:
+        SyntheticProject: The generated project.
+    """
+    rng = random.Random(seed)
+    project_dir = os.path.join(base_dir, 'Project')
+    as_path = os.path.join(base_dir, 'AS412')
+    as_base_path = os.path.join(base_dir, 'AS')
+    data_path = os.path.join(base_dir, 'Data')
+    upgrades = os.path.join(as_path, 'Upgrades')
+
+    def upgrade(path):
+        _write(path, rng.randbytes(upgrade_size))
+
+    # Project file with technology packages
+    packages = ''.join(f'<Package{index} Version="5.{index}.0" />' for index in range(technology_packages))
+    apj_file = os.path.join(project_dir, 'Project.apj')
+    _write(apj_file, '<?xml version="1.0" encoding="utf-8"?>\n'
+                     '<?AutomationStudio Version="4.12.5.95 SP"?>\n'
+                     '<Project xmlns="http://br-automation.co.at/AS/Project" Version="4.12.5.95">\n'
+                     f'  <TechnologyPackages>{packages}</TechnologyPackages>\n'
+                     '</Project>\n')
+    for index in range(technology_packages):
+        upgrade(os.path.join(upgrades, f'AS4_TP_Package{index}_5.{index}.0.exe'))
+
+    # Runtime and VC upgrades
+    upgrade(os.path.join(as_base_path, 'Upgrades', f"AS4_AR_{RUNTIME_FILE_VERSION}_{CPU_SUBSTITUTE}.exe"))
+    upgrade(os.path.join(upgrades, f'AS4_VC_{VC_VERSION}.exe'))
+
+    # Module firmware upgrades
+    types = [(f'X20DI{9000 + index}', f'1.{index % 5}.0.0') for index in range(module_types)]
+    for module_type, version in types:
+        upgrade(os.path.join(upgrades, module_type, version, f'{module_type}_{version}.exe'))
+
+    # External hardware modules
+    modules_path = os.path.join(data_path, 'AS' + AS_VERSION.replace('_', ''), 'Hardware', 'Modules')
+    for index in range(external_modules):
+        _write(os.path.join(modules_path, f'ExtModule{index}', '1.0', 'Source', f'ExtModule{index}.xdd'), _source_text(rng, 4096))
+
+    # Physical configurations
+    for config_index in range(configurations):
+        config_dir = os.path.join(project_dir, 'Physical', f'Config{config_index}')
+        _write(os.path.join(config_dir, 'X20CP0484', 'Cpu.pkg'),
+               '<?xml version="1.0" encoding="utf-8"?>\n'
+               '<Cpu xmlns="http://br-automation.co.at/AS/Cpu">\n'
+               f'  <Configuration ModuleId="{CPU_TYPE}">\n'
+               f'    <AutomationRuntime Version="{RUNTIME_VERSION}" />\n'
+               f'    <Vc FirmwareVersion="{VC_VERSION}" />\n'
+               '  </Configuration>\n'
+               '</Cpu>\n')
+        hardware = ['<?xml version="1.0" encoding="utf-8"?>\n<Hardware xmlns="http://br-automation.co.at/AS/Hardware">\n']
+        for index in range(modules):
+            module_type, version = types[rng.randrange(len(types))]
+            hardware.append(f'  <Module Name="M{index}" Type="{module_type}" Version="{version}">\n'
+                            f'    <Connector Name="X2X1" TargetModule="M{index + 1}" TargetConnector="X2X2" />\n'
+                            '    <Parameter ID="Supervision" Value="off" />\n'
+                            '  </Module>\n')
+        hardware.append('</Hardware>\n')
+        _write(os.path.join(config_dir, 'Hardware.hw'), ''.join(hardware))
+        devices = ''.join(f'<Module ModuleID="ExtModule{index}" Version="1.0"><SourceFile OriginalFile="ExtModule{index}.xdd" /></Module>'
+                          for index in range(external_modules))
+        _write(os.path.join(config_dir, 'X20CP0484', 'ExternalHardware', 'ExternalHardwareDevices.xml'),
+               f'<?xml version="1.0" encoding="utf-8"?>\n<ExternalHardware>{devices}</ExternalHardware>\n')
+
+    # Logical tree with source and binary files
+    folders = max(1, logical_files // 25)
+    for index in range(logical_files):
+        _write(os.path.join(project_dir, 'Logical', f'Package{index % folders}', f'Task{index // folders}', f'Cyclic{index}.st'),
+               _source_text(rng, logical_file_size))
+    for index in range(binary_files):
+        _write(os.path.join(project_dir, 'Logical', 'Media', f'Image{index}.bin'), rng.randbytes(binary_file_size))
+
+    # Folders that are skipped by default
+    _write(os.path.join(project_dir, 'Binaries', 'Config0', 'X20CP0484', 'arconfig.br'), rng.randbytes(4096))
+    _write(os.path.join(project_dir, 'Temp', 'Objects', 'temp.o'), rng.randbytes(4096))
+
+    as_paths = {AS_VERSION: as_path, AS_VERSION + '_base': as_base_path, 'data': data_path}
+    translate = {'x20cp04.*.*': CPU_SUBSTITUTE}
+    _write(os.path.join(base_dir, 'config.ini'),
+           '[AS]\n' + ''.join(f'{key} = {value}\n' for key, value in as_paths.items()) +
+           '\n[GENERAL]\ndebug_level = 0\n\n[TRANSLATE]\n' + ''.join(f'{key} = {value}\n' for key, value in translate.items()))
+    return SyntheticProject(base_dir, project_dir, apj_file, as_paths, translate)
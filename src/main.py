@@ -1,11 +1,16 @@
 import os
 import sys
 import argparse
+import multiprocessing
 import configparser
-from tkinter import Tk, messagebox
-from ui.hmi import HMI
 from utils.file_handler import process_files
-from typing import Optional
+from utils.log_handler import setup_logging, flush_log
+from utils.batch import run_batch
+from typing import Optional, List, TYPE_CHECKING
+
+# The GUI stack is only imported when the window is created, headless runs do not load Tk
+if TYPE_CHECKING:
+    from tkinter import Tk
 
 VERSION = "1.6"
 DEBUG_LEVEL = 0                                             
@@ -23,6 +28,16 @@ INCLUDE_BINARY_FOLDER_KEY = 'include_binary_folder'
 INCLUDE_DIAG_FOLDER_KEY = 'include_diag_folder'
 INCLUDE_TEMP_FOLDER_KEY = 'include_temp_folder'
 INCLUDE_DOT_FOLDER_KEY = 'include_dot_folder'
+JOBS_KEY = 'jobs'
+INCREMENTAL_KEY = 'incremental'
+BATCH_JOBS_KEY = 'batch_jobs'
+MAX_VOLUME_SIZE_KEY = 'max_volume_size'
+DELTA_BASELINE_KEY = 'delta_baseline'
+MANIFEST_KEY = 'manifest'
+PROFILE_KEY = 'profile'
+PROFILE_PSTATS_KEY = 'profile_pstats'
+FORMAT_KEY = 'format'
+LEVEL_KEY = 'level'
 
 def is_frozen() -> bool:
     """
@@ -72,14 +87,48 @@ def override_config_with_args(config: configparser.ConfigParser, args: argparse.
         config['GENERAL'][INCLUDE_TEMP_FOLDER_KEY] = str(args.include_temp_folder)
     if args.include_dot_folder is not None:
         config['GENERAL'][INCLUDE_DOT_FOLDER_KEY] = str(args.include_dot_folder)
+    if args.jobs is not None:
+        config['GENERAL'][JOBS_KEY] = str(args.jobs)
+    if args.incremental is not None:
+        config['GENERAL'][INCREMENTAL_KEY] = str(args.incremental)
+    if args.batch_jobs is not None:
+        config['GENERAL'][BATCH_JOBS_KEY] = str(args.batch_jobs)
+    if args.max_volume_size is not None:
+        config['GENERAL'][MAX_VOLUME_SIZE_KEY] = args.max_volume_size
+    if args.delta_baseline is not None:
+        config['GENERAL'][DELTA_BASELINE_KEY] = args.delta_baseline
+    if args.manifest is not None:
+        config['GENERAL'][MANIFEST_KEY] = str(args.manifest)
+    if args.profile is not None:
+        config['GENERAL'][PROFILE_KEY] = str(args.profile)
+    if args.profile_pstats is not None:
+        config['GENERAL'][PROFILE_PSTATS_KEY] = str(args.profile_pstats)
+    if args.format is not None or args.level is not None:
+        if not config.has_section('COMPRESSION'):
+            config.add_section('COMPRESSION')
+        if args.format is not None:
+            config['COMPRESSION'][FORMAT_KEY] = args.format
+        if args.level is not None:
+            config['COMPRESSION'][LEVEL_KEY] = str(args.level)
+
+def show_error(error_message: str) -> None:
+    """
+    Show an error message in a message box.
 
-def create_main_window() -> Tk:
+    Args:
+        error_message (str): The error text.
+    """
+    from tkinter import messagebox
+    messagebox.showerror("Error", error_message)
+
+def create_main_window() -> "Tk":
     """
     Create the main Tkinter window.
 
     Returns:
         Tk: The main Tkinter window.
     """
+    from tkinter import Tk
     root = Tk()
     root.minsize(600, 400)
     if os.path.exists(ICON_FILE):
@@ -99,7 +148,21 @@ def main(project_path: Optional[str] = None,
          include_binary_folder: Optional[bool] = None, 
          include_diag_folder: Optional[bool] = None, 
          include_temp_folder: Optional[bool] = None, 
-         include_dot_folder: Optional[bool] = None) -> None:
+         include_dot_folder: Optional[bool] = None,
+         jobs: Optional[int] = None,
+         incremental: Optional[bool] = None,
+         batch: Optional[List[str]] = None,
+         batch_jobs: Optional[int] = None,
+         batch_summary: Optional[str] = None,
+         profile: Optional[bool] = None,
+         profile_pstats: Optional[bool] = None,
+         output: Optional[str] = None,
+         archive_format: Optional[str] = None,
+         level: Optional[int] = None,
+         max_volume_size: Optional[str] = None,
+         delta_baseline: Optional[str] = None,
+         apply_delta: Optional[List[str]] = None,
+         manifest: Optional[bool] = None) -> None:
     """
     Main function to run the application.
 
@@ -116,12 +179,38 @@ def main(project_path: Optional[str] = None,
         include_diag_folder (Optional[bool]): Include diagnosis folder.
         include_temp_folder (Optional[bool]): Include temp folder.
         include_dot_folder (Optional[bool]): Include dot folders.
+        jobs (Optional[int]): Number of parallel compression jobs, 0 uses all CPU cores.
+        incremental (Optional[bool]): Only compress files that changed since the last archive.
+        batch (Optional[List[str]]): Zip several projects headless, .apj files, directories, glob patterns or manifest files.
+        batch_jobs (Optional[int]): Number of projects zipped at the same time in batch mode, 0 uses all CPU cores.
+        batch_summary (Optional[str]): Path of a JSON file for the project summaries of the batch.
+        profile (Optional[bool]): Write timing and file system metrics per phase next to the ZIP file.
+        profile_pstats (Optional[bool]): Also write cProfile statistics next to the ZIP file.
+        output (Optional[str]): Path of the ZIP file, '-' streams the archive to stdout.
+        archive_format (Optional[str]): Archive format, zip, xz or zstd.
+        level (Optional[int]): Compression level of the archive format.
+        max_volume_size (Optional[str]): Split the archive into standalone volumes of at most this size, e.g. '2G'.
+        delta_baseline (Optional[str]): Only zip the changes against this baseline archive or manifest.
+        apply_delta (Optional[List[str]]): Baseline and delta archive to rebuild the full archive or project tree in output.
+        manifest (Optional[bool]): Write a MANIFEST.json with the SHA-256 of every file into the archive and next to it.
     """
+    # While the archive is streamed to stdout, messages go to stderr and errors exit non-zero
+    streaming = output == '-'
+    console = sys.stderr if streaming else sys.stdout
     try:
+        if batch or output or apply_delta:
+            headless = True
+        if batch and output:
+            print("Error: --output can not be used with --batch.")
+            sys.exit(1)
+        if apply_delta and not output:
+            print("Error: --apply_delta needs --output, a ZIP file or a directory.")
+            sys.exit(1)
+
         if not headless:
             root = create_main_window()
         else:
-            if project_path is None:
+            if project_path is None and not batch and not apply_delta:
                 print("Error: Project path not provided in headless mode.")
                 sys.exit(0)
 
@@ -132,10 +221,10 @@ def main(project_path: Optional[str] = None,
         if not os.path.exists(cfg_file):
             error_message = f"Configuration file '{cfg_file}' not found."
             if not headless:
-                messagebox.showerror("Error", error_message)
+                show_error(error_message)
             else:
-                print(f"Error: {error_message}")
-            sys.exit(0)
+                print(f"Error: {error_message}", file=console)
+            sys.exit(1 if streaming else 0)
 
         config = load_config(cfg_file)
         override_config_with_args(config, argparse.Namespace(
@@ -148,27 +237,60 @@ def main(project_path: Optional[str] = None,
             include_binary_folder=include_binary_folder,
             include_diag_folder=include_diag_folder,
             include_temp_folder=include_temp_folder,
-            include_dot_folder=include_dot_folder
+            include_dot_folder=include_dot_folder,
+            jobs=jobs,
+            incremental=incremental,
+            batch_jobs=batch_jobs,
+            profile=profile,
+            profile_pstats=profile_pstats,
+            format=archive_format,
+            level=level,
+            max_volume_size=max_volume_size,
+            delta_baseline=delta_baseline,
+            manifest=manifest
         ))
+        # The log goes to stderr while the archive is streamed to stdout
+        setup_logging(config, gui=not headless, stream=sys.stderr if streaming else None)
 
         if not headless:
+            from ui.hmi import HMI
             app = HMI(root, config, cfg_file, VERSION)
             if project_path:
                 if not os.path.exists(project_path):
-                    messagebox.showerror("Error", f"Error: The specified project path '{project_path}' does not exist.")
+                    show_error(f"Error: The specified project path '{project_path}' does not exist.")
                     sys.exit(0)
                 app.project_path_var.set(project_path)
                 app.zip_button.grid(row=1, column=0, sticky="e")
             root.mainloop()
+        elif apply_delta:
+            from utils.delta import apply_delta as rebuild
+            try:
+                result = rebuild(apply_delta[0], apply_delta[1], output)
+            except Exception as e:
+                print(f"Error: Failed to apply the delta: {e}")
+                sys.exit(1)
+            print(f"Rebuilt {output}: {result['from_baseline']} files from the baseline, {result['from_delta']} from the delta, {result['deleted']} deleted")
+        elif batch:
+            summaries = run_batch(config, batch, batch_summary)
+            flush_log()
+            if not summaries or not all(summary.success for summary in summaries):
+                sys.exit(1)
         else:
-            process_files(config, project_path, None)
+            summary = process_files(config, project_path, None, output=sys.stdout.buffer if streaming else output)
+            flush_log()
+            if streaming:
+                sys.stdout.flush()
+                if not summary.success:
+                    sys.exit(1)
 
     except Exception as e:
         error_message = f"General program error: {e}"
         if not headless:
-            messagebox.showerror("Error", error_message)
+            show_error(error_message)
         else:
-            print(error_message)
+            print(error_message, file=console)
+        if streaming:
+            sys.exit(1)
 
 def parse_arguments() -> argparse.Namespace:
     """
@@ -190,15 +312,31 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("--include_diag_folder", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Include diagnosis folder")
     parser.add_argument("--include_temp_folder", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Include temp folder")
     parser.add_argument("--include_dot_folder", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Include dot folders")
+    parser.add_argument("--jobs", type=int, help="Number of parallel compression jobs, 0 uses all CPU cores")
+    parser.add_argument("--incremental", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Only compress files that changed since the last archive")
+    parser.add_argument("--batch", nargs='+', metavar="SOURCE", help="Zip several projects headless, .apj files, directories, glob patterns or manifest files")
+    parser.add_argument("--batch_jobs", type=int, help="Number of projects zipped at the same time in batch mode, 0 uses all CPU cores")
+    parser.add_argument("--batch_summary", help="Write the project summaries of the batch to a JSON file")
+    parser.add_argument("--profile", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Write timing and file system metrics per phase next to the ZIP file")
+    parser.add_argument("--profile_pstats", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Also write cProfile statistics next to the ZIP file")
+    parser.add_argument("--output", help="Path of the ZIP file, '-' streams the archive to stdout")
+    parser.add_argument("--format", choices=["zip", "xz", "zstd"], help="Archive format: zip (DEFLATE), xz (tar.xz) or zstd (tar.zst)")
+    parser.add_argument("--level", type=int, help="Compression level of the archive format")
+    parser.add_argument("--max_volume_size", "--max-volume-size", help="Split the archive into standalone volumes of at most this size, e.g. 500M or 2G")
+    parser.add_argument("--delta_baseline", help="Only zip the files that changed since this baseline archive or manifest")
+    parser.add_argument("--apply_delta", nargs=2, metavar=("BASELINE", "DELTA"), help="Rebuild the full archive or project tree from a baseline and a delta archive into --output")
+    parser.add_argument("--manifest", nargs='?', const=True, type=lambda x: x.lower() == 'true' if x else True, help="Write a MANIFEST.json with the SHA-256 of every file into the archive and next to it")
     return parser.parse_args()
 
 if __name__ == "__main__":
+    # The configuration scan uses worker processes, they need this in the frozen exe
+    multiprocessing.freeze_support()
     try:
         args = parse_arguments()
-        main(args.project_path, args.headless, args.debug_level, args.separate_update_files, args.include_runtime_updates, args.include_technology_updates, args.include_hardware_updates, args.include_as_updates, args.include_binary_folder, args.include_diag_folder, args.include_temp_folder, args.include_dot_folder)
+        main(args.project_path, args.headless, args.debug_level, args.separate_update_files, args.include_runtime_updates, args.include_technology_updates, args.include_hardware_updates, args.include_as_updates, args.include_binary_folder, args.include_diag_folder, args.include_temp_folder, args.include_dot_folder, args.jobs, args.incremental, args.batch, args.batch_jobs, args.batch_summary, args.profile, args.profile_pstats, args.output, args.format, args.level, args.max_volume_size, args.delta_baseline, args.apply_delta, args.manifest)
     except Exception as e:
         error_message = f"General program error: {e}"
         if not args.headless:
-            messagebox.showerror("Error", error_message)
+            show_error(error_message)
         else:
             print(error_message)
\ No newline at end of file
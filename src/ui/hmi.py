@@ -1,10 +1,16 @@
 import tkinter as tk
 import tkinter.font as tkFont
 import os
+import queue
+import threading
 from tkinter import Label, Button, Entry, Frame, Checkbutton, IntVar, messagebox, Toplevel, StringVar, ttk, Text, Scrollbar, filedialog
 from utils.file_handler import process_files, create_log
+from utils.log_handler import get_log_buffer
 from datetime import datetime
 
+# Interval in which log lines and events of the zipping job are shown in the window
+EVENT_POLL_MS = 50
+
 class Tooltip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -41,12 +47,17 @@ class HMI:
         self.VERSION = VERSION  # Store VERSION as an instance variable
         self.DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
         self.cancelled = False
+        self.events = queue.Queue()
+        self.worker = None
+        self.log_buffer = get_log_buffer()
+        self.log_position = self.log_start = self.log_buffer.position
         master.title(f"B&R project file zipper version {VERSION}")
 
         INCLUDE_BINARY = self.config.getboolean('GENERAL', 'include_binary_folder', fallback=False)
         INCLUDE_DIAG = self.config.getboolean('GENERAL', 'include_diag_folder', fallback=False)
         INCLUDE_TEMP = self.config.getboolean('GENERAL', 'include_temp_folder', fallback=False)
-        INCLUDE_DOT = self.config.getboolean('GENERAL', 'include_dot', fallback=False)
+        # Older configuration files use the key include_dot
+        INCLUDE_DOT = self.config.getboolean('GENERAL', 'include_dot_folder', fallback=self.config.getboolean('GENERAL', 'include_dot', fallback=False))
         SEPARATE_UPDATE_FILES = self.config.getboolean('GENERAL', 'separate_update_files', fallback=False)
         INCLUDE_RUNTIME_UPDATES = self.config.getboolean('GENERAL', 'include_runtime_updates', fallback=True)
         INCLUDE_TECHNOLOGY_UPDATES = self.config.getboolean('GENERAL', 'include_technology_updates', fallback=True)
@@ -75,6 +86,10 @@ class HMI:
         self.progress = ttk.Progressbar(path_frame, orient="horizontal", length=200, mode="determinate")
         self.progress.grid(row=1, column=0, columnspan=2, pady=(10, 0), sticky="ew")
 
+        # Throughput and remaining time of the compression
+        self.progress_label = Label(path_frame, text="", font=tkFont.Font(size=9))
+        self.progress_label.grid(row=2, column=0, columnspan=2, sticky="w")
+
         # Frame for the button
         button_frame = Frame(master)
         button_frame.grid(row=0, column=1, padx=(0, 20), pady=20, sticky="e")
@@ -172,6 +187,8 @@ class HMI:
         master.columnconfigure(0, weight=1)  # Make log_frame expand horizontally
         master.columnconfigure(1, weight=0)
 
+        master.after(EVENT_POLL_MS, self.poll_events)
+
     # Handle open file dialog
     def open_file(self):
         """
@@ -218,13 +235,80 @@ class HMI:
         self.log_text.delete("1.0", "end")  # Clear the log
         self.log_text.configure(state="disabled")
         self.progress['value'] = 0
+        self.progress_label.configure(text="")
 
         # Refresh the window
         self.master.update()
 
         self.cancelled = False
+        self.log_position = self.log_start = self.log_buffer.position
         create_log(f"Starting with version {self.VERSION}")
-        process_files(self.config, project_path, self)
+
+        # Run the job in the background, the window is updated from the event queue
+        self.worker = threading.Thread(target=self.run_job, args=(project_path,), daemon=True)
+        self.worker.start()
+
+    def run_job(self, project_path):
+        """
+        Runs the zipping job, called on the worker thread.
+        """
+        try:
+            process_files(self.config, project_path, self)
+        finally:
+            self.post_event('done', project_path)
+
+    def post_event(self, kind, value=None):
+        """
+        Queues an event for the window, can be called from any thread.
+
+        Args:
+            kind (str): 'progress', 'status', 'error' or 'done'.
+            value: Progress value, progress text, error text or project path.
+        """
+        self.events.put((kind, value))
+
+    def poll_events(self):
+        """
+        Shows new log lines and all queued events of the zipping job in one batch.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+
+        # Log lines of the events are already in the buffer
+        log_lines, self.log_position = self.log_buffer.lines_since(self.log_position)
+        self.append_log(log_lines)
+
+        for kind, value in events:
+            if kind == 'progress':
+                self.progress['value'] = value
+            elif kind == 'status':
+                self.progress_label.configure(text=value)
+            elif kind == 'error':
+                messagebox.showerror("Error", value)
+            elif kind == 'done':
+                self.job_finished(value)
+
+        self.master.after(EVENT_POLL_MS, self.poll_events)
+
+    def append_log(self, log_lines):
+        """
+        Appends log lines to the log window.
+        """
+        if log_lines:
+            self.log_text.configure(state="normal")  # Enable editing temporarily
+            self.log_text.insert("end", "\n".join(log_lines) + "\n")
+            self.log_text.configure(state="disabled") # Disable editing again
+            self.log_text.see("end") # Autoscroll to the end
+
+    def job_finished(self, project_path):
+        """
+        Restores the window after the zipping job finished.
+        """
+        self.worker = None
 
         # Show the buttons again
         self.open_button.grid(row=0, column=0, sticky="e")
@@ -306,9 +390,10 @@ class HMI:
 
     def on_include_dot_checkbox_change(self):
         if self.include_dot_var.get() == 1:
-            self.config.set('GENERAL', 'include_dot', "True")
+            self.config.set('GENERAL', 'include_dot_folder', "True")
         else:
-            self.config.set('GENERAL', 'include_dot', "False")
+            self.config.set('GENERAL', 'include_dot_folder', "False")
+        self.config.remove_option('GENERAL', 'include_dot')
         with open (self.cfg_file, 'w') as configfile:
             self.config.write(configfile)
 
@@ -324,7 +409,8 @@ class HMI:
         """
         Saves the log text to a file.
         """
-        log_content = self.log_text.get("1.0", "end-1c")
+        log_lines, _ = self.log_buffer.lines_since(self.log_start)
+        log_content = "\n".join(log_lines)
         if log_content:
             file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
             if file_path:
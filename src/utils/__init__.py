@@ -0,0 +1,22 @@
+import importlib
+
+# Public library API, loaded on first access so the command line does not import it
+_EXPORTS = {
+    'ArchiveOptions': 'utils.api',
+    'ArchiveJob': 'utils.api',
+    'ArchiveResult': 'utils.api',
+    'ArchiveFile': 'utils.api',
+    'ArchiveError': 'utils.api',
+    'ProjectNotFoundError': 'utils.api',
+    'ConfigurationError': 'utils.api',
+    'ArchiveCancelledError': 'utils.api',
+    'archive_project': 'utils.api',
+    'apply_delta': 'utils.delta',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
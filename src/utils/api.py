@@ -0,0 +1,337 @@
+import os
+import configparser
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from utils.compression_policy import DEFAULT_STORE_EXTENSIONS, split_list
+from utils.archive_backends import get_archive_backend
+from utils.file_handler import process_files, find_project_file, open_file, read_as_version
+from utils.log_handler import logger, setup_logging, RingBufferHandler
+
+class ArchiveError(Exception):
+    """
+    Base class of the errors raised by archive_project().
+
+    Args:
+        message (str): Description of the error.
+        result (ArchiveResult): Result of the job up to the error, None if the job did not start.
+    """
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+    @property
+    def errors(self):
+        return self.result.errors if self.result else []
+
+class ProjectNotFoundError(ArchiveError):
+    """
+    The project path does not exist or has no .apj file.
+    """
+
+class ConfigurationError(ArchiveError):
+    """
+    The options do not fit the project, e.g. its Automation Studio version is not configured.
+    """
+
+class ArchiveCancelledError(ArchiveError):
+    """
+    The job was cancelled.
+    """
+
+@dataclass
+class ArchiveOptions:
+    """
+    Options of a zipping job, the same settings as in config.ini.
+
+    as_paths holds the [AS] section: the installation path per AS version ('4_12'),
+    the base path per version ('4_12_base') and the data path ('data').
+    translate holds the ordered [TRANSLATE] rules, CPU type pattern to substitute.
+    """
+    as_paths: Dict[str, str] = field(default_factory=dict)
+    debug_level: int = 0
+    separate_update_files: bool = False
+    include_runtime_updates: bool = True
+    include_technology_updates: bool = True
+    include_hardware_updates: bool = True
+    include_as_updates: bool = False
+    include_binary_folder: bool = False
+    include_diag_folder: bool = False
+    include_temp_folder: bool = False
+    include_dot_folder: bool = False
+    jobs: int = 1
+    scan_jobs: int = 1
+    max_volume_size: str = ''
+    delta_baseline: str = ''
+    manifest: bool = False
+    incremental: bool = False
+    incremental_crc: bool = False
+    translate: Dict[str, str] = field(default_factory=dict)
+    cache_directory: str = ''
+    upgrade_index: bool = True
+    member_cache: bool = True
+    member_cache_size_mb: int = 1024
+    hash_cache: bool = True
+    store_extensions: List[str] = field(default_factory=lambda: split_list(DEFAULT_STORE_EXTENSIONS))
+    store_paths: List[str] = field(default_factory=list)
+    adaptive: bool = True
+    adaptive_sample_size: int = 65536
+    adaptive_threshold: float = 0.9
+    archive_format: str = 'zip'
+    level: Optional[int] = None
+    exclude_patterns: List[str] = field(default_factory=list)
+    include_patterns: List[str] = field(default_factory=list)
+    profile: bool = False
+    profile_pstats: bool = False
+    log_output: bool = False
+
+    # Options stored in the [GENERAL] section
+    GENERAL_KEYS = ('debug_level', 'separate_update_files', 'include_runtime_updates', 'include_technology_updates',
+                    'include_hardware_updates', 'include_as_updates', 'include_binary_folder', 'include_diag_folder',
+                    'include_temp_folder', 'include_dot_folder', 'jobs', 'scan_jobs', 'max_volume_size', 'delta_baseline',
+                    'manifest', 'incremental', 'incremental_crc', 'profile', 'profile_pstats')
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the options from a loaded configuration.
+
+        Args:
+            config (configparser.ConfigParser): Loaded configuration.
+
+        Returns:
+            ArchiveOptions: The options, missing settings keep their defaults.
+        """
+        options = cls()
+        if 'AS' in config:
+            options.as_paths = dict(config.items('AS'))
+        if 'TRANSLATE' in config:
+            options.translate = dict(config.items('TRANSLATE'))
+        for key in cls.GENERAL_KEYS:
+            if config.has_option('GENERAL', key):
+                default = getattr(options, key)
+                if isinstance(default, bool):
+                    setattr(options, key, config.getboolean('GENERAL', key))
+                elif isinstance(default, str):
+                    setattr(options, key, config.get('GENERAL', key))
+                else:
+                    setattr(options, key, config.getint('GENERAL', key))
+        options.cache_directory = config.get('CACHE', 'directory', fallback=options.cache_directory)
+        options.upgrade_index = config.getboolean('CACHE', 'upgrade_index', fallback=options.upgrade_index)
+        options.member_cache = config.getboolean('CACHE', 'member_cache', fallback=options.member_cache)
+        options.member_cache_size_mb = config.getint('CACHE', 'member_cache_size_mb', fallback=options.member_cache_size_mb)
+        options.hash_cache = config.getboolean('CACHE', 'hash_cache', fallback=options.hash_cache)
+        if config.has_option('COMPRESSION', 'store_extensions'):
+            options.store_extensions = split_list(config.get('COMPRESSION', 'store_extensions'))
+        options.store_paths = split_list(config.get('COMPRESSION', 'store_paths', fallback=''))
+        options.adaptive = config.getboolean('COMPRESSION', 'adaptive', fallback=options.adaptive)
+        options.adaptive_sample_size = config.getint('COMPRESSION', 'adaptive_sample_size', fallback=options.adaptive_sample_size)
+        options.adaptive_threshold = config.getfloat('COMPRESSION', 'adaptive_threshold', fallback=options.adaptive_threshold)
+        options.archive_format = config.get('COMPRESSION', 'format', fallback=options.archive_format).strip() or options.archive_format
+        level = config.get('COMPRESSION', 'level', fallback='').strip()
+        options.level = int(level) if level else None
+        options.exclude_patterns = split_list(config.get('EXCLUDE', 'patterns', fallback=''))
+        options.include_patterns = split_list(config.get('EXCLUDE', 'include', fallback=''))
+        return options
+
+    def to_config(self):
+        """
+        Create a new configuration from the options, for the file handlers.
+
+        Returns:
+            configparser.ConfigParser: The configuration.
+        """
+        config = configparser.ConfigParser()
+        config['AS'] = dict(self.as_paths)
+        config['GENERAL'] = {key: str(getattr(self, key)) for key in self.GENERAL_KEYS}
+        config['CACHE'] = {
+            'directory': self.cache_directory,
+            'upgrade_index': str(self.upgrade_index),
+            'member_cache': str(self.member_cache),
+            'member_cache_size_mb': str(self.member_cache_size_mb),
+            'hash_cache': str(self.hash_cache),
+        }
+        config['COMPRESSION'] = {
+            'store_extensions': ', '.join(self.store_extensions),
+            'store_paths': ', '.join(self.store_paths),
+            'adaptive': str(self.adaptive),
+            'adaptive_sample_size': str(self.adaptive_sample_size),
+            'adaptive_threshold': str(self.adaptive_threshold),
+            'format': self.archive_format,
+            'level': '' if self.level is None else str(self.level),
+        }
+        config['EXCLUDE'] = {
+            'patterns': ', '.join(self.exclude_patterns),
+            'include': ', '.join(self.include_patterns),
+        }
+        config['TRANSLATE'] = dict(self.translate)
+        return config
+
+@dataclass
+class ArchiveFile:
+    """
+    One written archive.
+    """
+    path: str
+    members: List[str]
+    bytes_in: int
+    bytes_out: int
+
+    @property
+    def ratio(self):
+        # Compressed size relative to the size of the files
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+@dataclass
+class ArchiveResult:
+    """
+    Result of a zipping job.
+
+    timings holds the duration of the phases 'technology', 'configurations',
+    'project_files' and 'compression' in seconds.
+    """
+    project_path: str
+    success: bool
+    archives: List[ArchiveFile]
+    timings: Dict[str, float]
+    duration: float
+    missing_upgrades: List[str]
+    errors: List[str]
+
+    @property
+    def members(self):
+        return [member for archive in self.archives for member in archive.members]
+
+    @property
+    def bytes_in(self):
+        return sum(archive.bytes_in for archive in self.archives)
+
+    @property
+    def bytes_out(self):
+        return sum(archive.bytes_out for archive in self.archives)
+
+    @property
+    def ratio(self):
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    @classmethod
+    def from_summary(cls, summary):
+        """
+        Create the result from the summary of process_files().
+
+        Args:
+            summary (JobSummary): Summary of the job.
+
+        Returns:
+            ArchiveResult: The result.
+        """
+        archives = [ArchiveFile(path, summary.members.get(path, []), summary.archive_bytes_in.get(path, 0), summary.archive_bytes_out.get(path, 0))
+                    for path in summary.archives]
+        return cls(summary.project_path, summary.success, archives, dict(summary.phases), summary.duration, list(summary.missing), list(summary.errors))
+
+class ArchiveJob:
+    """
+    Zipping job of one project, for use as a library.
+
+    The job reports through return values and exceptions instead of the GUI. It
+    takes the place of the HMI for the file handlers, so progress is passed to the
+    progress callback and cancel() stops the job at the next file.
+
+    Args:
+        project_path (str): Path of the .apj file or the project directory.
+        options (ArchiveOptions): Options of the job, None uses the defaults.
+        progress (callable): Called with (percent, status text) while compressing.
+        executor (concurrent.futures.Executor): Shared compression pool, None creates a pool per archive.
+        output (str or file object): Path of the ZIP file, or a writable binary file object the archive is
+            streamed to in one forward only pass. None writes <project>.zip next to the project directory.
+    """
+    def __init__(self, project_path, options=None, progress: Optional[Callable[[float, str], None]] = None, executor=None, output=None):
+        self.project_path = project_path
+        self.options = options or ArchiveOptions()
+        self.progress = progress
+        self.executor = executor
+        self.output = output
+        self.cancelled = False
+        self.percent = 0
+        self.status = ''
+
+    def cancel(self):
+        """
+        Stop the job, run() raises ArchiveCancelledError.
+        """
+        self.cancelled = True
+
+    def post_event(self, kind, value=None):
+        # Events of the file handlers, see HMI.post_event
+        if kind == 'progress':
+            self.percent = value
+        elif kind == 'status':
+            self.status = value
+            if self.progress:
+                self.progress(self.percent, value)
+
+    def run(self):
+        """
+        Zip the project.
+
+        Returns:
+            ArchiveResult: The result of the job.
+
+        Raises:
+            ProjectNotFoundError: The project does not exist.
+            ConfigurationError: The archive format is invalid or the AS version of the project is not configured.
+            ArchiveCancelledError: The job was cancelled.
+            ArchiveError: The job failed.
+        """
+        config = self.options.to_config()
+        if not any(isinstance(handler, RingBufferHandler) for handler in logger.handlers):
+            setup_logging(config, gui=not self.options.log_output)
+
+        project_file = find_project_file(self.project_path)
+        if project_file is None:
+            raise ProjectNotFoundError(f"No project found at '{self.project_path}'")
+        self.check_configuration(config, project_file)
+
+        summary = process_files(config, project_file, self, self.executor, self.output)
+        result = ArchiveResult.from_summary(summary)
+        if summary.cancelled or self.cancelled:
+            raise ArchiveCancelledError(f"Zipping '{self.project_path}' was cancelled", result)
+        if not summary.success:
+            message = summary.errors[-1] if summary.errors else "unknown error"
+            raise ArchiveError(f"Zipping '{self.project_path}' failed: {message}", result)
+        return result
+
+    def check_configuration(self, config, project_file):
+        # Fail early on an unknown archive format and when the AS version of the project has no paths
+        try:
+            get_archive_backend(config)
+        except ValueError as e:
+            raise ConfigurationError(str(e))
+        content = open_file(project_file, None)
+        if content is None:
+            raise ProjectNotFoundError(f"Can not read the project file '{project_file}'")
+        full_version, as_version = read_as_version(content)
+        if full_version is None:
+            raise ConfigurationError(f"No AS version found in '{project_file}'")
+        if not config.has_option('AS', as_version):
+            raise ConfigurationError(f"No path configured for AS version {as_version}")
+        if not os.path.exists(config.get('AS', as_version)):
+            raise ConfigurationError(f"The path '{config.get('AS', as_version)}' of AS version {as_version} does not exist")
+
+def archive_project(project_path, options=None, progress=None, executor=None, output=None):
+    """
+    Zip a project with its upgrades.
+
+    Args:
+        project_path (str): Path of the .apj file or the project directory.
+        options (ArchiveOptions): Options of the job, None uses the defaults.
+        progress (callable): Called with (percent, status text) while compressing.
+        executor (concurrent.futures.Executor): Shared compression pool, None creates a pool per archive.
+        output (str or file object): Path of the ZIP file or a writable binary file object, see ArchiveJob.
+
+    Returns:
+        ArchiveResult: The result of the job.
+
+    Raises:
+        ArchiveError: The job failed, see ArchiveJob.run() for the subclasses.
+    """
+    return ArchiveJob(project_path, options, progress, executor, output).run()
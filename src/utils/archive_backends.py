@@ -0,0 +1,264 @@
+import io
+import os
+import time
+import zlib
+import hashlib
+import tarfile
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from utils.archive_writer import ArchiveWriter, CHUNK_SIZE
+from utils.file_hashes import file_hash
+
+# Archive format selectable in [COMPRESSION] format, levels are inclusive
+ArchiveBackend = namedtuple('ArchiveBackend', ['name', 'extension', 'writer', 'default_level', 'min_level', 'max_level', 'description'])
+
+DEFAULT_FORMAT = 'zip'
+
+class TarArchiveWriter(ABC):
+    """
+    Writes a tar archive through a stream compressor, with the interface of ArchiveWriter.
+
+    The whole archive is one compressed stream, so there are no per member settings:
+    the compression policy, the member cache and incremental mode only apply to ZIP
+    archives. The archive is written in one forward only pass and can be streamed.
+    Set hashes to a dict to collect the size, CRC32 and SHA-256 of the added files.
+    Every format is a subclass that implements open_stream().
+
+    Args:
+        file_name (str): Path of the archive, or a writable file object the archive is streamed to.
+        level (int): Compression level of the stream compressor.
+        jobs (int): Number of compression threads, if the compressor supports them.
+    """
+    def __init__(self, file_name, level, jobs=1):
+        self.level = level
+        self.jobs = jobs
+        self.progress = None
+        self.hashes = None
+        self.reused = 0
+        self.cached = 0
+        self.arcnames = set()
+        self.own_file = isinstance(file_name, str)
+        self.file = open(file_name, 'wb') if self.own_file else file_name
+        try:
+            self.stream = self.open_stream(self.file)
+            self.tar = tarfile.open(fileobj=self.stream, mode='w|', format=tarfile.PAX_FORMAT, bufsize=CHUNK_SIZE)
+        except Exception:
+            if self.own_file:
+                self.file.close()
+                os.remove(file_name)
+            raise
+
+    @abstractmethod
+    def open_stream(self, file):
+        """
+        Wrap the output into the stream compressor, implemented by every format.
+
+        Args:
+            file: Writable binary file object.
+
+        Returns:
+            Writable binary file object that compresses into file, closing it must not close file.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __contains__(self, arcname):
+        return arcname in self.arcnames
+
+    def add_file(self, file_path, arcname, compress_type=None, cache=False):
+        """
+        Add a file to the archive unless a member with the same name exists.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            arcname (str): Name of the member inside the archive.
+            compress_type (int): Ignored, the whole archive is compressed.
+            cache (bool): Ignored, there is no member cache for tar archives.
+
+        Returns:
+            bool: True if the file was added, False if it was already in the archive.
+        """
+        if arcname in self.arcnames:
+            return False
+        tarinfo = self.tar.gettarinfo(file_path, arcname.replace(os.sep, '/'))
+        with open(file_path, 'rb') as source:
+            reader = _ProgressReader(source, self._advance, self.hashes is not None)
+            self.tar.addfile(tarinfo, reader)
+        if self.hashes is not None:
+            self.hashes[arcname] = file_hash(reader.size, reader.crc, reader.sha256.hexdigest())
+        self.arcnames.add(arcname)
+        return True
+
+    def add_files(self, entries, jobs=1, executor=None):
+        """
+        Add several files to the archive in the order of entries.
+
+        Args:
+            entries (iterable): (file path, arcname, size) tuples, the size is ignored.
+            jobs (int): Ignored, the stream compressor has its own threads.
+            executor (concurrent.futures.Executor): Ignored.
+
+        Yields:
+            tuple: (file path, arcname, added) for every entry once it is written.
+        """
+        for file_path, arcname, _ in entries:
+            yield file_path, arcname, self.add_file(file_path, arcname)
+
+    def add_data(self, arcname, data):
+        """
+        Add a member with generated content, e.g. a manifest.
+
+        Args:
+            arcname (str): Name of the member inside the archive.
+            data (bytes): Content of the member.
+
+        Returns:
+            bool: True if the member was added, False if it was already in the archive.
+        """
+        if arcname in self.arcnames:
+            return False
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.size = len(data)
+        tarinfo.mtime = int(time.time())
+        tarinfo.mode = 0o644
+        self.tar.addfile(tarinfo, io.BytesIO(data))
+        self.arcnames.add(arcname)
+        return True
+
+    def add_directory(self, arcname):
+        """
+        Add an empty directory entry to the archive.
+
+        Args:
+            arcname (str): Name of the directory, ending with '/'.
+        """
+        if arcname not in self.arcnames:
+            tarinfo = tarfile.TarInfo(arcname.rstrip('/'))
+            tarinfo.type = tarfile.DIRTYPE
+            tarinfo.mode = 0o755
+            self.tar.addfile(tarinfo)
+            self.arcnames.add(arcname)
+
+    def _advance(self, size):
+        if self.progress is not None:
+            self.progress(size)
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.stream.close()
+            if self.own_file:
+                self.file.close()
+            else:
+                self.file.flush()
+            self.tar = None
+
+    def discard(self):
+        """
+        Close an archive that failed or was cancelled, there is no previous archive to restore.
+        """
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class _ProgressReader:
+    # Reports the bytes tarfile reads from a source file and optionally hashes them
+    def __init__(self, file, advance, hashing=False):
+        self.file = file
+        self.advance = advance
+        self.sha256 = hashlib.sha256() if hashing else None
+        self.crc = 0
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        if self.sha256 is not None:
+            self.sha256.update(data)
+            self.crc = zlib.crc32(data, self.crc)
+            self.size += len(data)
+        self.advance(len(data))
+        return data
+
+class XzArchiveWriter(TarArchiveWriter):
+    """
+    Tar archive compressed with LZMA in the XZ container.
+    """
+    def open_stream(self, file):
+        import lzma
+        return lzma.LZMAFile(file, 'w', format=lzma.FORMAT_XZ, preset=self.level)
+
+class ZstdArchiveWriter(TarArchiveWriter):
+    """
+    Tar archive compressed with zstd, using one compression thread per job.
+    """
+    def open_stream(self, file):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The zstd format needs the zstandard package, install it with 'pip install zstandard'")
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.jobs if self.jobs > 1 else 0)
+        return compressor.stream_writer(file, closefd=False)
+
+BACKENDS = {
+    'zip': ArchiveBackend('zip', '.zip', ArchiveWriter, 6, 0, 9, "ZIP with DEFLATE, opens in Automation Studio and Windows"),
+    'xz': ArchiveBackend('xz', '.tar.xz', XzArchiveWriter, 6, 0, 9, "tar compressed with LZMA/XZ, smallest and slowest"),
+    'zstd': ArchiveBackend('zstd', '.tar.zst', ZstdArchiveWriter, 3, 1, 22, "tar compressed with multi-threaded zstd"),
+}
+
+def get_archive_backend(config):
+    """
+    Get the archive format and compression level from the [COMPRESSION] section.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+
+    Returns:
+        tuple: (ArchiveBackend, level), level is None when the backend default is used.
+
+    Raises:
+        ValueError: The format is unknown or the level is out of its range.
+    """
+    name = config.get('COMPRESSION', 'format', fallback=DEFAULT_FORMAT).strip().lower() or DEFAULT_FORMAT
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown archive format '{name}', use one of {', '.join(BACKENDS)}")
+    backend = BACKENDS[name]
+    level = config.get('COMPRESSION', 'level', fallback='').strip()
+    if not level:
+        return backend, None
+    level = int(level)
+    if not backend.min_level <= level <= backend.max_level:
+        raise ValueError(f"Compression level {level} is out of range {backend.min_level}-{backend.max_level} of the {name} format")
+    return backend, level
+
+def strip_archive_extension(file_name):
+    # Remove a known archive extension, including the double extensions of tar archives
+    for backend in BACKENDS.values():
+        if file_name.lower().endswith(backend.extension):
+            return file_name[:-len(backend.extension)]
+    return os.path.splitext(file_name)[0]
+
+def open_archive(backend, target, level=None, jobs=1, **zip_options):
+    """
+    Open the writer of an archive.
+
+    Args:
+        backend (ArchiveBackend): Format of the archive.
+        target (str or StreamOutput): Path of the archive or the stream it is written to.
+        level (int): Compression level, None uses the default of the format.
+        jobs (int): Number of compression jobs.
+        **zip_options: policy, previous, compare_crc and member_cache of ArchiveWriter.
+
+    Returns:
+        ArchiveWriter or TarArchiveWriter: The open archive.
+    """
+    if backend.writer is ArchiveWriter:
+        return ArchiveWriter(target, 'w', level=level, **zip_options)
+    return backend.writer(target, backend.default_level if level is None else level, jobs)
@@ -0,0 +1,532 @@
+import os
+import time
+import zlib
+import struct
+import hashlib
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.file_hashes import hash_file, file_hash
+
+# Read size used when compressing files in worker threads
+CHUNK_SIZE = 1024 * 1024
+
+# Files larger than this are compressed by the writer itself to keep memory bounded
+PARALLEL_MAX_FILE_SIZE = 64 * 1024 * 1024
+
+# Total size of the files that are compressed in parallel and not written yet
+PARALLEL_WINDOW_SIZE = 256 * 1024 * 1024
+
+def read_raw(zipf, zinfo):
+    """
+    Read the stored data of a ZIP member without decompressing it.
+
+    Args:
+        zipf (zipfile.ZipFile): Archive opened for reading.
+        zinfo (zipfile.ZipInfo): Member to read.
+
+    Yields:
+        bytes: Chunks of the compressed member data.
+    """
+    with zipf._lock:
+        zipf.fp.seek(zinfo.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, zipf.fp.read(zipfile.sizeFileHeader))
+        # Skip the file name and extra field of the local header
+        data_offset = zinfo.header_offset + zipfile.sizeFileHeader + header[10] + header[11]
+    remaining = zinfo.compress_size
+    while remaining > 0:
+        with zipf._lock:
+            zipf.fp.seek(data_offset + zinfo.compress_size - remaining)
+            chunk = zipf.fp.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {zinfo.filename}")
+        remaining -= len(chunk)
+        yield chunk
+
+def file_crc(file_path):
+    """
+    Calculate the CRC32 of a file.
+
+    Args:
+        file_path (str): Path of the file.
+
+    Returns:
+        int: CRC32 of the file content.
+    """
+    crc = 0
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def deflate_file(file_path, level=None, sha256=False, policy=None):
+    """
+    Compress a file into a raw DEFLATE stream as stored inside a ZIP member.
+
+    Args:
+        file_path (str): Path of the file to compress.
+        level (int): DEFLATE level 0-9, None uses the zlib default.
+        sha256 (bool): Also calculate the SHA-256 of the file while it is read.
+        policy (CompressionPolicy): Checks the first chunk of the file in adaptive mode, None deflates it.
+
+    Returns:
+        tuple: (compressed bytes, CRC32, uncompressed size, SHA-256 hex digest or None), None if the policy stores the file.
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    digest = hashlib.sha256() if sha256 else None
+    chunks = []
+    crc = 0
+    file_size = 0
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if policy is not None and file_size == 0 and policy.sample_type(chunk) == zipfile.ZIP_STORED:
+                return None
+            crc = zlib.crc32(chunk, crc)
+            if digest is not None:
+                digest.update(chunk)
+            file_size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    return b''.join(chunks), crc, file_size, digest.hexdigest() if digest is not None else None
+
+class StreamOutput:
+    """
+    Forward only view of a writable binary file object, e.g. stdout.
+
+    It has no seek(), so zipfile writes the archive in one sequential pass and puts the
+    CRC and sizes of streamed members into data descriptors behind their data. The
+    bytes written are counted for tell().
+
+    Args:
+        fileobj: Writable binary file object.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.position = 0
+        name = getattr(fileobj, 'name', None)
+        self.name = name if isinstance(name, str) else '<stream>'
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.fileobj.flush()
+
+class ArchiveWriter:
+    """
+    Keeps a ZIP archive open for the whole zipping job.
+
+    The archive is opened once and the names of all members are tracked in memory,
+    so adding a file does not re-read or rewrite the central directory. Set progress to
+    a callable to get the number of bytes processed while files are added. Set hashes to
+    a dict to collect the size, CRC32 and SHA-256 per member name in the same pass that
+    reads the files for the compressor. Members that are copied without reading the
+    file, e.g. from the previous archive, are not in it.
+
+    Args:
+        zip_file_name (str): Path of the ZIP file to write, or a writable file object the archive is streamed to.
+        mode (str): 'w' to create a new archive, 'a' to append to an existing one.
+        policy (CompressionPolicy): Decides which members are stored uncompressed, None deflates everything.
+        previous (str): Path of the previous version of the archive. Members of files that did not
+            change since then are copied from it without compressing them again. The file is
+            deleted when the writer is closed and moved back over the new archive when it is
+            discarded.
+        compare_crc (bool): Also compare the CRC32 of a file before copying it from the previous archive.
+        member_cache (MemberCache): Cache of compressed members used for files added with cache=True.
+        level (int): DEFLATE level 0-9, None uses the zlib default.
+    """
+    def __init__(self, zip_file_name, mode='w', policy=None, previous=None, compare_crc=False, member_cache=None, level=None):
+        if not isinstance(zip_file_name, str):
+            # Streamed archives are written forward only, without seeking back to patch headers
+            zip_file_name = zip_file_name if isinstance(zip_file_name, StreamOutput) else StreamOutput(zip_file_name)
+            mode = 'w'
+        self.zip_file_name = zip_file_name
+        self.policy = policy
+        self.previous = previous
+        self.previous_zipf = zipfile.ZipFile(previous, 'r') if previous else None
+        self.compare_crc = compare_crc
+        # Cached members are deflated with the default level 6 of zlib
+        self.member_cache = member_cache if level in (None, 6) else None
+        self.level = level
+        self.progress = None
+        self.hashes = None
+        self.reused = 0
+        self.cached = 0
+        self.zipf = zipfile.ZipFile(zip_file_name, mode, zipfile.ZIP_DEFLATED, compresslevel=level)
+        self.arcnames = set(self.zipf.namelist())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __contains__(self, arcname):
+        return arcname in self.arcnames
+
+    def add_file(self, file_path, arcname, compress_type=None, cache=False):
+        """
+        Add a file to the archive unless a member with the same name exists.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            arcname (str): Name of the member inside the archive.
+            compress_type (int): Compression method, None asks the compression policy.
+            cache (bool): Take the compressed data from the member cache and store it there.
+
+        Returns:
+            bool: True if the file was added, False if it was already in the archive.
+        """
+        if arcname in self.arcnames:
+            return False
+        previous_info = self._unchanged_member(file_path, arcname)
+        if previous_info is not None:
+            self._copy_member(previous_info, arcname)
+            return True
+        return self._add_new_file(file_path, arcname, compress_type, cache)
+
+    def _add_new_file(self, file_path, arcname, compress_type=None, cache=False):
+        # Write a file that is not in the previous archive, see add_file
+        # Only members deflated by the policy are sampled, not an explicit compression method
+        sample = compress_type is None and self.policy is not None
+        if compress_type is None:
+            compress_type = self.compress_type(file_path, arcname)
+        if cache and self.member_cache is not None and compress_type == zipfile.ZIP_DEFLATED:
+            if self._add_cached(file_path, arcname):
+                return True
+        self._write_file(file_path, arcname, compress_type, sample)
+        self.arcnames.add(arcname)
+        return True
+
+    def _write_file(self, file_path, arcname, compress_type, sample=False):
+        # Stream a file into the archive and report the progress per chunk
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        digest = hashlib.sha256() if self.hashes is not None else None
+        with open(file_path, 'rb') as source:
+            chunk = source.read(CHUNK_SIZE)
+            if sample and compress_type == zipfile.ZIP_DEFLATED:
+                # The policy checks the first chunk instead of reading the file itself
+                compress_type = self.policy.sample_type(chunk)
+            zinfo.compress_type = compress_type
+            with self.zipf.open(zinfo, 'w') as dest:
+                while chunk:
+                    dest.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    self._advance(len(chunk))
+                    chunk = source.read(CHUNK_SIZE)
+        # zipfile sets the CRC and size of the member when it is closed
+        if digest is not None:
+            self._add_hash(arcname, zinfo.file_size, zinfo.CRC, digest.hexdigest())
+
+    def _add_hash(self, arcname, size, crc, sha256):
+        if self.hashes is not None and sha256:
+            self.hashes[arcname] = file_hash(size, crc, sha256)
+
+    def _advance(self, size):
+        if self.progress is not None:
+            self.progress(size)
+
+    def _add_cached(self, file_path, arcname):
+        # Copy the compressed data from the member cache, compress into the cache on a miss
+        try:
+            entry = self.member_cache.get(file_path)
+            if entry is None:
+                entry = self.member_cache.store(file_path)
+                if entry is None:
+                    return False
+            else:
+                self.cached += 1
+        except OSError:
+            return False
+        try:
+            # Cached members that do not compress well are stored like in _write_file
+            if self.policy is not None and self.policy.deflated_type(entry['compress_size'], entry['file_size']) == zipfile.ZIP_STORED:
+                return False
+            # The blob is opened before the member header is written
+            try:
+                data = self.member_cache.read(entry)
+            except OSError:
+                return False
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            zinfo.CRC = entry['crc']
+            zinfo.file_size = entry['file_size']
+            zinfo.compress_size = entry['compress_size']
+            self._write_raw(zinfo, data)
+        finally:
+            self.member_cache.release(entry)
+        self.arcnames.add(arcname)
+        self._add_hash(arcname, entry['file_size'], entry['crc'], entry.get('sha256'))
+        self._advance(zinfo.file_size)
+        return True
+
+    def compress_type(self, file_path, arcname):
+        """
+        Get the compression method of a new member from its name by the compression policy.
+
+        In adaptive mode, deflated members can still be stored once the first chunk of
+        the file is read.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            arcname (str): Name of the member inside the archive.
+
+        Returns:
+            int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+        """
+        if self.policy is None:
+            return zipfile.ZIP_DEFLATED
+        return self.policy.compress_type(file_path, arcname)
+
+    def add_files(self, entries, jobs=1, executor=None):
+        """
+        Add several files to the archive, optionally compressing them in parallel.
+
+        With more than one job, files are deflated by a pool of worker threads and
+        written by this writer in the order of entries, so the archive content does
+        not depend on the number of jobs. The files in flight are bounded by their
+        total size, see PARALLEL_WINDOW_SIZE.
+
+        Args:
+            entries (iterable): (file path, arcname, size) tuples, a size of None is read from the file system.
+            jobs (int): Number of worker threads, 1 compresses serially.
+            executor (concurrent.futures.Executor): Shared pool of worker threads, None creates a pool for this call.
+
+        Yields:
+            tuple: (file path, arcname, added) for every entry once it is written.
+        """
+        if jobs <= 1:
+            for file_path, arcname, _ in entries:
+                yield file_path, arcname, self.add_file(file_path, arcname)
+            return
+
+        shared = executor is not None
+        if not shared:
+            executor = ThreadPoolExecutor(max_workers=jobs)
+        pending = deque()
+        pending_size = 0
+        try:
+            for file_path, arcname, size in entries:
+                if size is None:
+                    size = os.path.getsize(file_path)
+                future = previous_info = None
+                if arcname not in self.arcnames:
+                    previous_info = self._unchanged_member(file_path, arcname)
+                    if previous_info is None and size <= PARALLEL_MAX_FILE_SIZE:
+                        future = executor.submit(self._deflate_member, file_path, arcname)
+                        pending_size += size
+                pending.append((file_path, arcname, size, future, previous_info))
+                # Keep a bounded window of compressed files in memory
+                while len(pending) > jobs * 4 or (pending_size > PARALLEL_WINDOW_SIZE and len(pending) > 1):
+                    pending_size -= self._pending_size(pending[0])
+                    yield self._write_pending(*pending.popleft())
+            while pending:
+                yield self._write_pending(*pending.popleft())
+        finally:
+            futures = [entry[3] for entry in pending if entry[3] is not None]
+            if shared:
+                # Only drop the work of this archive, the pool keeps running for other archives
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _pending_size(entry):
+        # Bytes a pending entry holds in memory, only compressed files count
+        return entry[2] if entry[3] is not None else 0
+
+    def _deflate_member(self, file_path, arcname):
+        # Runs in a worker thread, returns None for members that are stored
+        if self.compress_type(file_path, arcname) == zipfile.ZIP_STORED:
+            return None
+        return deflate_file(file_path, self.level, self.hashes is not None, self.policy)
+
+    def _write_pending(self, file_path, arcname, size, future, previous_info):
+        # The previous archive was already searched when the entry was queued
+        if arcname in self.arcnames:
+            return file_path, arcname, False
+        if previous_info is not None:
+            self._copy_member(previous_info, arcname)
+            return file_path, arcname, True
+        if future is None:
+            return file_path, arcname, self._add_new_file(file_path, arcname)
+        result = future.result()
+        if result is None:
+            return file_path, arcname, self._add_new_file(file_path, arcname, zipfile.ZIP_STORED)
+        data, crc, file_size, sha256 = result
+        return file_path, arcname, self.add_compressed(file_path, arcname, data, crc, file_size, sha256)
+
+    def add_compressed(self, file_path, arcname, data, crc, file_size, sha256=None):
+        """
+        Add an already deflated file to the archive without compressing it again.
+
+        Args:
+            file_path (str): Path of the source file, used for the timestamp and attributes.
+            arcname (str): Name of the member inside the archive.
+            data (bytes): Raw DEFLATE stream of the file.
+            crc (int): CRC32 of the uncompressed file.
+            file_size (int): Uncompressed size of the file.
+            sha256 (str): SHA-256 hex digest of the file, added to hashes if given.
+
+        Returns:
+            bool: True if the file was added, False if it was already in the archive.
+        """
+        if arcname in self.arcnames:
+            return False
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(data)
+        self._write_raw(zinfo, data)
+        self.arcnames.add(arcname)
+        self._add_hash(arcname, file_size, crc, sha256)
+        self._advance(file_size)
+        return True
+
+    def _unchanged_member(self, file_path, arcname):
+        # Find the member of the previous archive if the file did not change since then
+        if self.previous_zipf is None:
+            return None
+        try:
+            zinfo = self.previous_zipf.getinfo(arcname.replace(os.sep, '/'))
+        except KeyError:
+            return None
+        st = os.stat(file_path)
+        date_time = time.localtime(st.st_mtime)[0:6]
+        # ZIP timestamps have a resolution of two seconds
+        date_time = date_time[0:5] + (date_time[5] // 2 * 2,)
+        if zinfo.file_size != st.st_size or zinfo.date_time != date_time or zinfo.flag_bits & 0x01:
+            return None
+        if self.compare_crc:
+            if self.hashes is not None:
+                # The file is read anyway, keep its hashes for the reused member
+                hashes = self.hashes.get(arcname) or hash_file(file_path)
+                if int(hashes['crc32'], 16) != zinfo.CRC:
+                    return None
+                self.hashes[arcname] = hashes
+            elif file_crc(file_path) != zinfo.CRC:
+                return None
+        return zinfo
+
+    def _copy_member(self, previous_info, arcname):
+        # Copy the compressed data of a member from the previous archive
+        self.copy_member(self.previous_zipf, previous_info, arcname)
+        self.reused += 1
+
+    def copy_member(self, source_zipf, source_info, arcname=None):
+        """
+        Copy a member of another archive without decompressing it.
+
+        Args:
+            source_zipf (zipfile.ZipFile): Archive opened for reading.
+            source_info (zipfile.ZipInfo): Member to copy.
+            arcname (str): Name of the member in this archive, None keeps the name.
+
+        Returns:
+            bool: True if the member was copied, False if it was already in the archive.
+        """
+        arcname = arcname or source_info.filename
+        if arcname in self.arcnames:
+            return False
+        zinfo = zipfile.ZipInfo(arcname, source_info.date_time)
+        zinfo.compress_type = source_info.compress_type
+        zinfo.external_attr = source_info.external_attr
+        zinfo.CRC = source_info.CRC
+        zinfo.file_size = source_info.file_size
+        zinfo.compress_size = source_info.compress_size
+        self._write_raw(zinfo, read_raw(source_zipf, source_info))
+        self.arcnames.add(arcname)
+        self._advance(zinfo.file_size)
+        return True
+
+    def add_data(self, arcname, data):
+        """
+        Add a member with generated content, e.g. a manifest.
+
+        Args:
+            arcname (str): Name of the member inside the archive.
+            data (bytes): Content of the member.
+
+        Returns:
+            bool: True if the member was added, False if it was already in the archive.
+        """
+        if arcname in self.arcnames:
+            return False
+        zinfo = zipfile.ZipInfo(arcname, time.localtime()[0:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o644 << 16
+        self.zipf.writestr(zinfo, data)
+        self.arcnames.add(arcname)
+        return True
+
+    def _write_raw(self, zinfo, data):
+        # Append a member whose data is already in its final stored form
+        zipf = self.zipf
+        zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+        with zipf._lock:
+            zipf._writecheck(zinfo)
+            zipf._didModify = True
+            zinfo.header_offset = zipf.fp.tell()
+            zipf.fp.write(zinfo.FileHeader(zip64))
+            if isinstance(data, bytes):
+                zipf.fp.write(data)
+            else:
+                for chunk in data:
+                    zipf.fp.write(chunk)
+            zipf.filelist.append(zinfo)
+            zipf.NameToInfo[zinfo.filename] = zinfo
+            zipf.start_dir = zipf.fp.tell()
+
+    def add_directory(self, arcname):
+        """
+        Add an empty directory entry to the archive.
+
+        Args:
+            arcname (str): Name of the directory, ending with '/'.
+        """
+        if arcname not in self.arcnames:
+            self.zipf.writestr(arcname, '')
+            self.arcnames.add(arcname)
+
+    def close(self):
+        # Finish the archive, the previous archive is not needed any more
+        if self.zipf is not None:
+            self.zipf.close()
+            self.zipf = None
+        if self.previous_zipf is not None:
+            self.previous_zipf.close()
+            self.previous_zipf = None
+            os.remove(self.previous)
+
+    def discard(self):
+        """
+        Close an archive that failed or was cancelled, the previous archive replaces it again.
+        """
+        if self.zipf is not None:
+            try:
+                self.zipf.close()
+            except Exception:
+                pass
+            self.zipf = None
+        if self.previous_zipf is not None:
+            self.previous_zipf.close()
+            self.previous_zipf = None
+            os.replace(self.previous, self.zip_file_name)
@@ -0,0 +1,147 @@
+import os
+import glob
+import json
+from concurrent.futures import ThreadPoolExecutor
+from utils.file_handler import process_files, get_jobs, create_log, create_error
+from utils.job_plan import JobSummary
+from utils.progress import format_size
+from utils.log_handler import flush_log, tag_log
+
+# Get the number of projects zipped at the same time
+def get_batch_jobs(config):
+    jobs = config.getint('GENERAL', 'batch_jobs', fallback=2)
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+def collect_projects(sources):
+    """
+    Expand the sources of a batch into a list of projects.
+
+    Args:
+        sources (list): .apj files, project directories, directories holding project
+            directories, glob patterns or manifest files with one source per line.
+
+    Returns:
+        list: Paths of the projects, every project only once.
+    """
+    projects = []
+    seen = set()
+    for source in sources:
+        for project in _expand_source(source):
+            key = os.path.normcase(os.path.abspath(project))
+            if key not in seen:
+                seen.add(key)
+                projects.append(project)
+    return projects
+
+def _expand_source(source):
+    if any(char in source for char in '*?['):
+        for path in sorted(glob.glob(source, recursive=True)):
+            yield from _expand_source(path)
+
+    elif os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        apj_files = [name for name in names if name.endswith('.apj')]
+        if apj_files:
+            yield os.path.join(source, apj_files[0])
+        else:
+            # A directory holding several projects
+            for name in names:
+                folder = os.path.join(source, name)
+                if os.path.isdir(folder) and any(file.endswith('.apj') for file in os.listdir(folder)):
+                    yield folder
+
+    elif os.path.isfile(source) and not source.endswith('.apj'):
+        # Manifest file, paths are relative to the manifest
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield from _expand_source(os.path.join(base, line))
+
+    else:
+        # .apj files, and paths that do not exist so the job reports them
+        yield source
+
+def run_batch(config, sources, summary_file=None):
+    """
+    Zip several projects with a bounded pool of jobs.
+
+    All projects share the upgrade index, the member cache and one pool of compression
+    threads. A failing project does not stop the others. The log lines of every
+    project are prefixed with its name, see project_name().
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+        sources (list): Sources of the projects, see collect_projects().
+        summary_file (str): Path of a JSON file the summaries are written to, None for no file.
+
+    Returns:
+        list: JobSummary of every project, in the order of the sources.
+    """
+    projects = collect_projects(sources)
+    if not projects:
+        create_error("No projects found for the batch")
+        return []
+
+    BATCH_JOBS = min(get_batch_jobs(config), len(projects))
+    JOBS = get_jobs(config)
+    if BATCH_JOBS > 1 and config.getboolean('GENERAL', 'profile', fallback=False):
+        # The profiler counts the I/O of the whole process, so profiled projects run one at a time
+        create_log(f"Profiling, the projects are zipped one at a time")
+        BATCH_JOBS = 1
+    create_log(f"Zip {len(projects)} projects, {BATCH_JOBS} at a time")
+
+    compress_pool = ThreadPoolExecutor(max_workers=JOBS) if JOBS > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=BATCH_JOBS) as project_pool:
+            summaries = list(project_pool.map(lambda project: _run_project(config, project, compress_pool), projects))
+    finally:
+        if compress_pool is not None:
+            compress_pool.shutdown(wait=True)
+
+    log_batch_summary(config, summaries)
+    if summary_file:
+        with open(summary_file, 'w', encoding='utf-8') as file:
+            json.dump([summary.to_dict() for summary in summaries], file, indent=2)
+    return summaries
+
+def project_name(project):
+    # Name of a project in the log, the .apj file or the project directory without the path
+    return os.path.splitext(os.path.basename(os.path.normpath(project)))[0]
+
+def _run_project(config, project, compress_pool):
+    with tag_log(project_name(project)):
+        try:
+            return process_files(config, project, None, compress_pool)
+        except Exception as e:
+            create_error(f"Failed to zip project '{project}': {e}")
+            summary = JobSummary(project)
+            summary.errors.append(str(e))
+            summary.finish()
+            return summary
+        finally:
+            flush_log()
+
+def log_batch_summary(config, summaries):
+    """
+    Log one line per project with its time, sizes and missing upgrades.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+        summaries (list): JobSummary of every project.
+    """
+    DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
+    create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------")
+    create_log(f"Batch summary")
+    for summary in summaries:
+        create_log(f"{'OK' if summary.success else 'FAILED'} {summary.project_path}: {summary.duration:.1f} s, {summary.file_count} files, "
+                   f"{format_size(summary.bytes_in)} in, {format_size(summary.bytes_out)} out, {len(summary.missing)} missing upgrades")
+        if DEBUG_LEVEL > 0:
+            for description in summary.missing:
+                create_log(f"    Missing {description}")
+        for error in summary.errors:
+            create_log(f"    {error}")
+    create_log(f"{sum(1 for summary in summaries if summary.success)} of {len(summaries)} projects zipped")
@@ -0,0 +1,103 @@
+import os
+import re
+import zlib
+import fnmatch
+import zipfile
+
+# File types that are already compressed and barely shrink under DEFLATE
+DEFAULT_STORE_EXTENSIONS = '.exe, .zip, .br, .7z, .gz, .rar, .xz, .zst, .cab, .msi, .png, .jpg, .jpeg, .gif, .mp3, .mp4, .avi, .pdf'
+
+class CompressionPolicy:
+    """
+    Decides per archive member whether it is deflated or stored uncompressed.
+
+    Args:
+        store_extensions (iterable): File extensions that are always stored, e.g. '.exe'.
+        store_paths (iterable): Glob patterns matched against the archive name of members that are always stored.
+        adaptive (bool): Sample the first chunk the writer reads of all other files and store them when they do not compress well.
+        sample_size (int): Number of bytes sampled in adaptive mode.
+        threshold (float): Compressed to uncompressed ratio of the sample above which a file is stored.
+    """
+    def __init__(self, store_extensions=(), store_paths=(), adaptive=False, sample_size=65536, threshold=0.9):
+        self.store_extensions = {ext.lower() if ext.startswith('.') else '.' + ext.lower() for ext in store_extensions}
+        store_paths = [fnmatch.translate(pattern.replace('\\', '/')) for pattern in store_paths]
+        self.store_paths = re.compile('|'.join(store_paths), re.IGNORECASE) if store_paths else None
+        self.adaptive = adaptive
+        self.sample_size = sample_size
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the policy from the [COMPRESSION] section of the configuration.
+
+        Args:
+            config (configparser.ConfigParser): Loaded configuration.
+
+        Returns:
+            CompressionPolicy: The compression policy.
+        """
+        return cls(
+            store_extensions=split_list(config.get('COMPRESSION', 'store_extensions', fallback=DEFAULT_STORE_EXTENSIONS)),
+            store_paths=split_list(config.get('COMPRESSION', 'store_paths', fallback='')),
+            adaptive=config.getboolean('COMPRESSION', 'adaptive', fallback=True),
+            sample_size=config.getint('COMPRESSION', 'adaptive_sample_size', fallback=65536),
+            threshold=config.getfloat('COMPRESSION', 'adaptive_threshold', fallback=0.9),
+        )
+
+    def compress_type(self, file_path, arcname):
+        """
+        Get the compression method of an archive member from its name.
+
+        The policy does not read files. In adaptive mode, members that are deflated by
+        name are checked again by the writer with sample_type() once it has read the
+        first chunk of the file.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            arcname (str): Name of the member inside the archive.
+
+        Returns:
+            int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+        """
+        if os.path.splitext(file_path)[1].lower() in self.store_extensions:
+            return zipfile.ZIP_STORED
+        if self.store_paths and self.store_paths.match(arcname.replace('\\', '/')):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def sample_type(self, sample):
+        """
+        Get the compression method of a member that is deflated by name from the beginning of the file.
+
+        Args:
+            sample (bytes): First bytes of the file, only sample_size bytes of it are compressed.
+
+        Returns:
+            int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+        """
+        sample = sample[:self.sample_size]
+        if self.adaptive and len(sample) >= 1024:
+            # Compress the sample with a fast level and check the ratio
+            if len(zlib.compress(sample, 1)) >= len(sample) * self.threshold:
+                return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def deflated_type(self, compress_size, file_size):
+        """
+        Get the compression method of a member that is deflated by name from its deflated size, e.g. in the member cache.
+
+        Args:
+            compress_size (int): Size of the deflated data.
+            file_size (int): Uncompressed size of the file.
+
+        Returns:
+            int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+        """
+        if self.adaptive and file_size >= 1024 and compress_size >= file_size * self.threshold:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+# Split a comma or newline separated configuration value
+def split_list(value):
+    return [item.strip() for item in value.replace('\n', ',').split(',') if item.strip()]
@@ -0,0 +1,103 @@
+import re
+import threading
+
+_translators = {}
+_translators_lock = threading.Lock()
+
+# Get the shared CPU translator for the TRANSLATE section of a configuration
+def get_cpu_translator(config):
+    """
+    Get the compiled TRANSLATE rules of a configuration.
+
+    Translators are shared per rule set, so the rules are only compiled again when
+    the TRANSLATE section changed.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+
+    Returns:
+        CpuTranslator: The translator.
+    """
+    rules = tuple((key.upper(), value.upper()) for key, value in config.items('TRANSLATE')) if 'TRANSLATE' in config else ()
+    with _translators_lock:
+        if rules not in _translators:
+            _translators[rules] = CpuTranslator(rules)
+        return _translators[rules]
+
+class CpuTranslator:
+    """
+    Maps CPU types to the CPU type used in the runtime upgrade file names.
+
+    The rules are tried in order and the first pattern that matches the start of the
+    CPU type wins. All patterns are compiled into one alternation with a named group
+    per rule, so a lookup is a single regex match. Rules that can not be combined,
+    e.g. because they use back references, are matched one after another instead.
+    Results are memoized per CPU type.
+
+    Args:
+        rules (list): (pattern, substitute) pairs in the order of the TRANSLATE section.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.patterns = [re.compile(pattern) for pattern, _ in self.rules]
+        try:
+            self.combined = re.compile('|'.join(f'(?P<r{index}>{pattern})' for index, (pattern, _) in enumerate(self.rules)))
+        except re.error:
+            self.combined = None
+        self.cache = {}
+        self.hits = [0] * len(self.rules)
+        self.lookups = 0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+
+    def _match(self, cpu_type):
+        # Get the index of the first matching rule, None if no rule matches
+        if not self.rules:
+            return None
+        if self.combined is not None:
+            match = self.combined.match(cpu_type)
+            return int(match.lastgroup[1:]) if match else None
+        for index, pattern in enumerate(self.patterns):
+            if pattern.match(cpu_type):
+                return index
+        return None
+
+    def translate(self, cpu_type):
+        """
+        Get the substitute CPU type.
+
+        Args:
+            cpu_type (str): CPU type from the Cpu.pkg file.
+
+        Returns:
+            str: The substitute of the first matching rule, None if no rule matches.
+        """
+        with self.lock:
+            self.lookups += 1
+            if cpu_type in self.cache:
+                self.cache_hits += 1
+                return self.cache[cpu_type]
+        index = self._match(cpu_type)
+        substitute = self.rules[index][1] if index is not None else None
+        with self.lock:
+            self.cache[cpu_type] = substitute
+            if index is not None:
+                self.hits[index] += 1
+        return substitute
+
+    def stats(self):
+        """
+        Get the rule evaluation statistics.
+
+        Returns:
+            dict: Number of rules and lookups, cached lookups, whether the combined pattern
+            is used and the number of matches per rule pattern for the rules that matched.
+        """
+        with self.lock:
+            return {
+                'rules': len(self.rules),
+                'combined': self.combined is not None,
+                'lookups': self.lookups,
+                'cache_hits': self.cache_hits,
+                'rule_hits': {self.rules[index][0]: hits for index, hits in enumerate(self.hits) if hits},
+            }
@@ -0,0 +1,229 @@
+import os
+import json
+import zipfile
+from datetime import datetime
+from utils.archive_writer import ArchiveWriter
+from utils.file_hashes import hash_files
+from utils.manifest import MANIFEST_NAME, MANIFEST_VERSION
+
+# Member of a delta archive with the added, changed and deleted files and the full file list
+DELTA_MANIFEST = 'DELTA.json'
+DELTA_VERSION = 1
+
+def load_baseline(baseline_file):
+    """
+    Read the file list of a baseline, a full archive or a manifest.
+
+    A ZIP archive gives the size and CRC32 of its members and the SHA-256 of the
+    members listed in its MANIFEST.json. A JSON manifest is the
+    DELTA.json of an earlier delta or any file with a 'files' entry that maps the
+    member names to their 'size', 'crc32' and 'sha256', or lists them with a 'path'.
+
+    Args:
+        baseline_file (str): Path of the baseline archive or manifest.
+
+    Returns:
+        dict: 'size', 'crc32' and, if known, 'sha256' per member name.
+
+    Raises:
+        ValueError: The file is a delta archive or no manifest.
+    """
+    if zipfile.is_zipfile(baseline_file):
+        with zipfile.ZipFile(baseline_file) as zipf:
+            if DELTA_MANIFEST in zipf.NameToInfo:
+                raise ValueError(f"'{baseline_file}' is a delta archive, use the full archive or the {DELTA_MANIFEST} of the delta")
+            files = {info.filename: {'size': info.file_size, 'crc32': f"{info.CRC:08x}"} for info in zipf.infolist() if not info.is_dir()}
+            if MANIFEST_NAME in zipf.NameToInfo:
+                for entry in json.loads(zipf.read(MANIFEST_NAME)).get('files', []):
+                    member = files.get(entry.get('path'))
+                    if member is not None and member['crc32'] == entry.get('crc32'):
+                        member['sha256'] = entry.get('sha256')
+                del files[MANIFEST_NAME]
+            return files
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    files = data.get('files') if isinstance(data, dict) else None
+    if isinstance(files, list):
+        files = {entry['path']: entry for entry in files}
+    if not isinstance(files, dict):
+        raise ValueError(f"'{baseline_file}' is neither a ZIP archive nor a manifest with a file list")
+    return files
+
+def is_unchanged(hashes, previous):
+    """
+    Compare the hashes of a file with its baseline entry.
+
+    SHA-256 is compared when the baseline has it, otherwise the CRC32.
+
+    Args:
+        hashes (dict): 'size', 'crc32' and 'sha256' of the current file.
+        previous (dict): Baseline entry of the file.
+
+    Returns:
+        bool: True if the file did not change.
+    """
+    if previous.get('size') != hashes['size']:
+        return False
+    if previous.get('sha256'):
+        return previous['sha256'] == hashes['sha256']
+    return previous.get('crc32') == hashes['crc32']
+
+def plan_delta(archive_plan, baseline_file, jobs=1, cache=None):
+    """
+    Reduce an archive plan to the files that were added or changed since the baseline.
+
+    All planned files are hashed. Unchanged files are removed from the plan and a
+    DELTA.json member is planned with the added, changed and deleted members and the
+    hashes of all current files, so the delta can be the baseline of the next one.
+
+    Args:
+        archive_plan (ArchivePlan): Plan of the full archive.
+        baseline_file (str): Path of the baseline archive or manifest.
+        jobs (int): Number of hashing threads.
+        cache (HashCache): Cache of known hashes, None hashes every file.
+
+    Returns:
+        dict: The delta manifest.
+    """
+    baseline = load_baseline(baseline_file)
+    entries = list(archive_plan)
+    hashes = hash_files([entry.file_path for entry in entries], jobs, cache)
+
+    files = {}
+    added = []
+    changed = []
+    kept = {}
+    for entry in entries:
+        name = entry.arcname.replace(os.sep, '/')
+        files[name] = hashes[entry.file_path]
+        previous = baseline.get(name)
+        if previous is None:
+            added.append(name)
+        elif is_unchanged(files[name], previous):
+            continue
+        else:
+            changed.append(name)
+        kept[entry.arcname] = entry
+
+    manifest = {
+        'version': DELTA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'baseline': os.path.basename(baseline_file),
+        'added': added,
+        'changed': changed,
+        'deleted': [name for name in baseline if name not in files],
+        'files': files,
+    }
+    archive_plan.entries = kept
+    archive_plan.add_generated(DELTA_MANIFEST, lambda archive: json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+def rebuild_manifest(baseline_zipf, delta_zipf, files, replaced, archive):
+    """
+    Create the MANIFEST.json of an archive rebuilt from a baseline and a delta.
+
+    The entry of a file is taken from the manifest of the archive it is copied from,
+    so the source and origin are kept. Files that are not in that manifest get the
+    hashes of the delta manifest.
+
+    Args:
+        baseline_zipf (zipfile.ZipFile): Baseline archive.
+        delta_zipf (zipfile.ZipFile): Delta archive.
+        files (dict): Hashes per member name of the rebuilt archive, see DELTA.json.
+        replaced (set): Names of the members taken from the delta.
+        archive (str): File name of the rebuilt archive.
+
+    Returns:
+        dict: The manifest, None if neither archive has one.
+    """
+    manifests = {}
+    for zipf in (baseline_zipf, delta_zipf):
+        if MANIFEST_NAME in zipf.NameToInfo:
+            manifests[zipf] = json.loads(zipf.read(MANIFEST_NAME))
+    if not manifests:
+        return None
+    entries = {zipf: {entry.get('path'): entry for entry in manifest.get('files', [])} for zipf, manifest in manifests.items()}
+    manifest_files = []
+    for name, hashes in files.items():
+        entry = entries.get(delta_zipf if name in replaced else baseline_zipf, {}).get(name)
+        if entry is None or entry.get('sha256') != hashes['sha256']:
+            entry = {'path': name, 'size': hashes['size'], 'crc32': hashes['crc32'], 'sha256': hashes['sha256'], 'source': None, 'origin': None}
+        manifest_files.append(entry)
+    # The delta is newer than the baseline, e.g. for the project path
+    manifest = manifests.get(delta_zipf) or manifests[baseline_zipf]
+    return {
+        'version': MANIFEST_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'project': manifest.get('project'),
+        'archive': archive,
+        'files': manifest_files,
+    }
+
+def apply_delta(baseline_file, delta_file, output):
+    """
+    Rebuild the full archive or project tree from a baseline archive and a delta archive.
+
+    Unchanged members are taken from the baseline, added and changed members from
+    the delta, deleted members are left out. Before anything is written, the size and
+    CRC32 of every baseline member that is kept are checked against the delta manifest.
+    If the baseline or the delta has a MANIFEST.json, it is rebuilt for the new file list.
+
+    Args:
+        baseline_file (str): Path of the full baseline archive.
+        delta_file (str): Path of the delta archive.
+        output (str): Path of the rebuilt ZIP file if it ends with '.zip', otherwise
+            the directory the files are extracted to.
+
+    Returns:
+        dict: Number of 'files', files taken 'from_baseline' and 'from_delta' and the number of 'deleted' files.
+
+    Raises:
+        ValueError: The delta does not fit the baseline.
+    """
+    with zipfile.ZipFile(delta_file) as delta_zipf, zipfile.ZipFile(baseline_file) as baseline_zipf:
+        if DELTA_MANIFEST not in delta_zipf.NameToInfo:
+            raise ValueError(f"'{delta_file}' is no delta archive, it has no {DELTA_MANIFEST}")
+        manifest = json.loads(delta_zipf.read(DELTA_MANIFEST))
+        files = manifest['files']
+        replaced = set(manifest['added']) | set(manifest['changed'])
+
+        # Find the source of every file and check the baseline members that are kept
+        sources = []
+        for name, hashes in files.items():
+            zipf = delta_zipf if name in replaced else baseline_zipf
+            info = zipf.NameToInfo.get(name)
+            if info is None:
+                raise ValueError(f"'{name}' is missing in '{delta_file if name in replaced else baseline_file}'")
+            if zipf is baseline_zipf and (info.file_size != hashes['size'] or f"{info.CRC:08x}" != hashes['crc32']):
+                raise ValueError(f"'{name}' in '{baseline_file}' differs from the baseline of the delta")
+            sources.append((zipf, info))
+        directories = [info for info in baseline_zipf.infolist() if info.is_dir()]
+        full_manifest = rebuild_manifest(baseline_zipf, delta_zipf, files, replaced, os.path.basename(output))
+        manifest_data = json.dumps(full_manifest, indent=2).encode('utf-8') if full_manifest is not None else None
+
+        if output.lower().endswith('.zip'):
+            temp_file = output + '.tmp'
+            try:
+                with ArchiveWriter(temp_file, 'w') as writer:
+                    for info in directories:
+                        writer.add_directory(info.filename)
+                    for zipf, info in sources:
+                        writer.copy_member(zipf, info)
+                    if manifest_data is not None:
+                        writer.add_data(MANIFEST_NAME, manifest_data)
+                os.replace(temp_file, output)
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+        else:
+            for info in directories:
+                baseline_zipf.extract(info, output)
+            for zipf, info in sources:
+                zipf.extract(info, output)
+            if manifest_data is not None:
+                with open(os.path.join(output, MANIFEST_NAME), 'wb') as file:
+                    file.write(manifest_data)
+
+    from_delta = sum(1 for zipf, _ in sources if zipf is delta_zipf)
+    return {'files': len(sources), 'from_baseline': len(sources) - from_delta, 'from_delta': from_delta, 'deleted': len(manifest['deleted'])}
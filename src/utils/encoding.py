@@ -0,0 +1,128 @@
+import os
+import re
+import codecs
+import threading
+from collections import OrderedDict
+
+# Byte order marks, UTF-32 first because its little endian BOM starts with the UTF-16 one
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+XML_DECLARATION = re.compile(rb'^\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+# Number of bytes passed to chardet when the encoding can not be found otherwise
+CHARDET_SAMPLE_SIZE = 64 * 1024
+
+# Number of decoded files kept in memory
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Tried in this order when the detected encoding does not decode the whole file, latin-1 decodes any bytes
+FALLBACK_ENCODINGS = ['cp1252', 'latin-1']
+
+def detect_encoding(raw_data):
+    """
+    Detect the encoding of a file.
+
+    Checks for a byte order mark and the XML encoding declaration first, then
+    tries UTF-8. chardet is only used when none of them decide, see decode_text().
+
+    Args:
+        raw_data (bytes): Content of the file.
+
+    Returns:
+        str: Name of the encoding that decodes the whole content.
+    """
+    return decode_text(raw_data)[1]
+
+def decode_text(raw_data):
+    """
+    Detect the encoding of a file and decode it in the same step.
+
+    Checks for a byte order mark and the XML encoding declaration first, then
+    tries UTF-8. chardet first only sees a sample of the data; when its guess does
+    not decode the whole file, chardet gets the whole file, then cp1252 and latin-1
+    are tried.
+
+    Args:
+        raw_data (bytes): Content of the file.
+
+    Returns:
+        tuple: (decoded text, name of the encoding)
+    """
+    for bom, encoding in BOMS:
+        if raw_data.startswith(bom):
+            return raw_data.decode(encoding), encoding
+
+    match = XML_DECLARATION.match(raw_data[:1024])
+    if match:
+        encoding = match.group(1).decode('ascii')
+        try:
+            return raw_data.decode(encoding), encoding
+        except (LookupError, UnicodeDecodeError):
+            pass
+
+    try:
+        return raw_data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    import chardet
+    encoding = chardet.detect(raw_data[:CHARDET_SAMPLE_SIZE])['encoding']
+    content = _decode(raw_data, encoding)
+    if content is None and len(raw_data) > CHARDET_SAMPLE_SIZE:
+        # The sample was not enough, e.g. ASCII with cp1252 bytes further down
+        encoding = chardet.detect(raw_data)['encoding']
+        content = _decode(raw_data, encoding)
+    for fallback in FALLBACK_ENCODINGS:
+        if content is not None:
+            break
+        encoding = fallback
+        content = _decode(raw_data, encoding)
+    return content, encoding
+
+def _decode(raw_data, encoding):
+    # Decoded text, None if the encoding is unknown or does not fit
+    if not encoding:
+        return None
+    try:
+        return raw_data.decode(encoding)
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+def read_text(file_path):
+    """
+    Read and decode a text file with a single read.
+
+    Results are cached per path, size and modification time, so reading the same
+    unchanged file again does not touch its content.
+
+    Args:
+        file_path (str): Path of the file.
+
+    Returns:
+        str: Content of the file with universal newlines.
+    """
+    st = os.stat(file_path)
+    key = (os.path.normcase(os.path.abspath(file_path)), st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    with open(file_path, 'rb') as file:
+        raw_data = file.read()
+    content, _ = decode_text(raw_data)
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+    with _cache_lock:
+        _cache[key] = content
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return content
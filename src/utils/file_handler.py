@@ -1,357 +1,605 @@
-import chardet
 import re
 import os
-import sys
+import json
 import xml.etree.ElementTree as ET
-import glob
-import zipfile
-from tkinter import messagebox
-from datetime import datetime
+from contextlib import ExitStack, nullcontext
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils.archive_writer import StreamOutput
+from utils.archive_backends import BACKENDS, DEFAULT_FORMAT, get_archive_backend, open_archive, strip_archive_extension
+from utils.compression_policy import CompressionPolicy
+from utils.upgrade_index import get_upgrade_index
+from utils.member_cache import get_member_cache
+from utils.log_handler import logger, get_log_buffer, capture_errors, share_errors
+from utils.job_plan import JobPlan, JobSummary
+from utils.progress import ProgressTracker, format_size, parse_size
+from utils.encoding import read_text
+from utils.physical_scanner import scan_physical, UpgradeArtifacts
+from utils.cpu_translator import get_cpu_translator
+from utils.profiler import Profiler, profile_phase
+from utils.file_hashes import get_hash_cache
+from utils.delta import plan_delta
+from utils.manifest import MANIFEST_NAME, manifest_file_name, plan_manifest
+from utils.project_walker import PathMatcher, walk_project
 
 def update_progress(hmi_instance, value):
     if hmi_instance:
-        hmi_instance.progress['value'] = value
-        hmi_instance.master.update()
+        hmi_instance.post_event('progress', value)
 
 # Process all files
-def process_files(config, file_path, hmi_instance=None):
-    try:
-        # If project_path is a directory, find the .apj file
-        if os.path.isdir(file_path):
-            apj_files = [f for f in os.listdir(file_path) if f.endswith('.apj')]
-            if not apj_files:
-                create_error(f"No .apj file found in the specified directory '{file_path}'", hmi_instance)
-                sys.exit(0)
-            file_path = os.path.join(file_path, apj_files[0])
-
-        # Create main zip file
-        main_file = updates_file = os.path.dirname(file_path) + ".zip"
-        create_zip_file(updates_file, config.getboolean('GENERAL', 'separate_update_files', fallback=False), hmi_instance)
-        if config.getboolean('GENERAL', 'separate_update_files', fallback=False):
-            updates_file = os.path.dirname(file_path) + "_Updates.zip"
-            create_zip_file(updates_file, config.getboolean('GENERAL', 'separate_update_files', fallback=False), hmi_instance)
-            
-        # Process project apj file, this are mapp components
-        update_progress(hmi_instance, 10)
-        content = open_file(file_path, hmi_instance)
-        as_version, result = tech_file_handling(config, updates_file, hmi_instance, content)
-        if not result or (hmi_instance and hmi_instance.cancelled):
-            return
-        
-        # Process the CPU file, this are the runtime files
-        if config.getboolean('GENERAL', 'include_runtime_updates', fallback=True):
-            update_progress(hmi_instance, 30)
-            result = cpu_file_handling(config, file_path, updates_file, as_version, hmi_instance)
-            if not result or (hmi_instance and hmi_instance.cancelled):
-                return
-
-        # Process the HW file, this are the firmware files
-        if config.getboolean('GENERAL', 'include_hardware_updates', fallback=True):
-            update_progress(hmi_instance, 50)
-            result = hw_file_handling(config, file_path, updates_file, as_version, hmi_instance)
-            if not result or (hmi_instance and hmi_instance.cancelled):
-                return
-
-        # Process project files
-        update_progress(hmi_instance, 70)
-        project_file_handling(config, main_file, hmi_instance)
-
-        create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
-        create_log(f"Finished", hmi_instance)
-        update_progress(hmi_instance, 100)
-
-    except Exception as e:
-        create_error(f"An error occurred: {e}", hmi_instance)
+def process_files(config, file_path, hmi_instance=None, executor=None, output=None):
+    """
+    Zip a project with its upgrades.
 
-# Process project files
-def project_file_handling(config, main_file, hmi_instance):
-    create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
-    create_log(f"Add project files", hmi_instance)
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+        file_path (str): Path of the .apj file or the project directory.
+        hmi_instance (HMI): Running GUI, None in headless mode.
+        executor (concurrent.futures.Executor): Shared compression pool, None creates a pool per archive.
+        output (str or file object): Path of the ZIP file, or a writable binary file object the archive
+            is streamed to in one forward only pass. None writes <project>.zip next to the project directory.
 
+    Returns:
+        JobSummary: Outcome of the job, success is False when it failed or was cancelled.
+    """
+    summary = JobSummary(file_path)
+    profiler = Profiler(config.getboolean('GENERAL', 'profile_pstats', fallback=False)) if config.getboolean('GENERAL', 'profile', fallback=False) else None
+    project_dir = None
+    with capture_errors(summary.errors), (profiler or nullcontext()):
+        try:
+            project_file = find_project_file(file_path)
+            if project_file is None:
+                if os.path.isdir(file_path):
+                    create_error(f"No .apj file found in the specified directory '{file_path}'", hmi_instance)
+                else:
+                    create_error(f"The project path '{file_path}' does not exist", hmi_instance)
+                return summary
+            file_path = project_file
+
+            SEPARATE_UPDATE_FILES = config.getboolean('GENERAL', 'separate_update_files', fallback=False)
+            project_dir = os.path.dirname(file_path)
+            upgrade_index = get_upgrade_index(config)
+            upgrade_index.refresh()
+
+            # A stream holds exactly one archive, the updates go into it
+            stream = StreamOutput(output) if output is not None and not isinstance(output, str) else None
+            if stream and SEPARATE_UPDATE_FILES:
+                create_log(f"Streaming the archive, the updates are not separated", hmi_instance)
+                SEPARATE_UPDATE_FILES = False
+            backend, _ = get_archive_backend(config)
+
+            # A delta holds the changes of the project and the updates against one baseline archive
+            DELTA_BASELINE = config.get('GENERAL', 'delta_baseline', fallback='')
+            if DELTA_BASELINE:
+                if backend.name != DEFAULT_FORMAT:
+                    create_error(f"Delta archives use the {DEFAULT_FORMAT} format", hmi_instance)
+                    return summary
+                if SEPARATE_UPDATE_FILES:
+                    create_log(f"Creating a delta archive, the updates are not separated", hmi_instance)
+                    SEPARATE_UPDATE_FILES = False
+            main_file = stream.name if stream else output or project_dir + ("_Delta" if DELTA_BASELINE else "") + backend.extension
+            updates_file = strip_archive_extension(main_file) + "_Updates" + backend.extension if SEPARATE_UPDATE_FILES else None
+
+            # Plan the job first, all files and their sizes are known before compressing
+            plan = JobPlan(main_file, updates_file, stream)
+            update_progress(hmi_instance, 0)
+
+            # Process project apj file, this are mapp components
+            with summary.phase('technology'), profile_phase('apj'):
+                content = open_file(file_path, hmi_instance)
+                as_version, result = tech_file_handling(config, plan.updates, hmi_instance, content, upgrade_index, file_path)
+            if not result or is_cancelled(hmi_instance, summary):
+                return summary
+
+            # Process the configurations, this are the runtime and firmware files
+            with summary.phase('configurations'):
+                result = physical_file_handling(config, file_path, plan.updates, as_version, hmi_instance, upgrade_index)
+            if not result or is_cancelled(hmi_instance, summary):
+                return summary
+
+            # Process project files
+            with summary.phase('project_files'), profile_phase('project_walk'):
+                result = project_file_handling(config, project_dir, plan.main, hmi_instance)
+            if not result or is_cancelled(hmi_instance, summary):
+                return summary
+            upgrade_index.save()
+
+            # Only keep the files that changed since the baseline
+            if DELTA_BASELINE:
+                with summary.phase('delta'), profile_phase('delta'):
+                    result = delta_file_handling(config, plan.main, DELTA_BASELINE, hmi_instance)
+                if not result or is_cancelled(hmi_instance, summary):
+                    return summary
+
+            # Split large archives into volumes that fit the transfer limit
+            MANIFEST = config.getboolean('GENERAL', 'manifest', fallback=False)
+            MAX_VOLUME_SIZE = get_max_volume_size(config)
+            if MAX_VOLUME_SIZE:
+                plan_volumes(plan, MAX_VOLUME_SIZE, hmi_instance, MANIFEST)
+
+            # List the size, hashes and origin of every file in a manifest, the hashes are taken while compressing
+            manifests = plan_manifests(config, plan, file_path) if MANIFEST else {}
+            summary.set_plan(plan)
+
+            # Compress all planned files
+            with summary.phase('compression'), profile_phase('compression'):
+                result = write_archives(config, plan, hmi_instance, executor)
+            if stream:
+                summary.archive_bytes_out[main_file] = stream.tell()
+            if not result or is_cancelled(hmi_instance, summary):
+                return summary
+            if plan.volumes and not write_volume_index(plan, strip_archive_extension(main_file) + "_Volumes.json", hmi_instance):
+                return summary
+            if manifests and not write_manifests(config, plan, manifests, hmi_instance):
+                return summary
+
+            create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
+            create_log(f"Finished", hmi_instance)
+            update_progress(hmi_instance, 100)
+            summary.success = True
+
+        except Exception as e:
+            create_error(f"An error occurred: {e}", hmi_instance)
+        finally:
+            summary.finish()
+
+    if profiler and project_dir:
+        save_profile(profiler, project_dir, summary, config, hmi_instance)
+    return summary
+
+# Write the metrics of a profiled job next to the archive
+def save_profile(profiler, project_dir, summary, config, hmi_instance):
     try:
+        metrics_file = project_dir + "_profile.json"
+        pstats_file = project_dir + "_profile.pstats" if profiler.pstats else None
+        profiler.save(metrics_file, pstats_file, project=summary.project_path, success=summary.success, jobs=get_jobs(config),
+                      files=summary.file_count, bytes_in=summary.bytes_in, bytes_out=summary.bytes_out)
+        create_log(f"Profile written to {metrics_file}", hmi_instance)
+    except Exception as e:
+        create_error(f"Failed to write the profile: {e}", hmi_instance)
 
-        DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
-        INCLUDE_BINARY = config.getboolean('GENERAL', 'include_binary_folder', fallback=False)
-        INCLUDE_DIAG = config.getboolean('GENERAL', 'include_diag_folder', fallback=False)
-        INCLUDE_TEMP = config.getboolean('GENERAL', 'include_temp_folder', fallback=False)
-        INCLUDE_DOT = config.getboolean('GENERAL', 'include_dot', fallback=False)
+# Check if the job was cancelled and note it in the summary
+def is_cancelled(hmi_instance, summary):
+    summary.cancelled = bool(hmi_instance and hmi_instance.cancelled)
+    return summary.cancelled
 
-        with zipfile.ZipFile(main_file, 'a', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(main_file.replace('.zip', '')):
-                if hmi_instance and hmi_instance.cancelled:
-                    create_log(f"Cancelled", hmi_instance)
-                    return False
-                
-                dot_folders = [d for d in dirs if d.startswith('.')]
-                if dot_folders:
-                    if not INCLUDE_DOT:
-                        if DEBUG_LEVEL > 1:
-                            create_log(f"Removed dot folders: {dot_folders}", hmi_instance)
+# Find the .apj file of a project
+def find_project_file(project_path):
+    """
+    Get the .apj file of a project.
 
-                        dirs[:] = [d for d in dirs if not d.startswith('.')]
-                if not INCLUDE_BINARY and 'Binaries' in dirs:
-                    dirs.remove('Binaries')  # Ignore the Binaries directory
-                    if DEBUG_LEVEL > 1:
-                        create_log(f"Removed binaries folder", hmi_instance)        
-                if not INCLUDE_DIAG and 'Diagnosis' in dirs:
-                    dirs.remove('Diagnosis')  # Ignore the diagnosis directory           
-                    if DEBUG_LEVEL > 1:
-                        create_log(f"Removed diagnosis folder", hmi_instance)        
-                if not INCLUDE_TEMP and 'Temp' in dirs:
-                    dirs.remove('Temp')  # Ignore the temp directory           
-                    if DEBUG_LEVEL > 1:
-                        create_log(f"Removed temp folder", hmi_instance)              
-                for file in files:
-                    if hmi_instance and hmi_instance.cancelled:
-                        create_log(f"Cancelled", hmi_instance) 
-                        return
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, main_file.replace('.zip', ''))
-                    zipf.write(file_path, arcname)
-                    if DEBUG_LEVEL > 1:
-                        create_log(f"Added {file_path}", hmi_instance)
+    Args:
+        project_path (str): Path of the .apj file or the project directory.
 
-    except Exception as e:
-        create_error(f"Failed to process project files: {e}", hmi_instance)
+    Returns:
+        str: Path of the .apj file, None if the path does not exist or the directory has no .apj file.
+    """
+    if os.path.isdir(project_path):
+        apj_files = [f for f in os.listdir(project_path) if f.endswith('.apj')]
+        return os.path.join(project_path, apj_files[0]) if apj_files else None
+    return project_path if os.path.exists(project_path) else None
 
-# Process PLC hardware files
-def hw_file_handling(config, file_path, updates_file, as_version, hmi_instance):
-    create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
-    create_log(f"Add hardware files", hmi_instance)
+# Read the AS version from the content of an apj file
+def read_as_version(content):
+    """
+    Get the Automation Studio version of a project.
 
-    try:
-        # Read the configuration file
-        DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
-        if config.has_option('AS', as_version):
-            config_as_path = config.get('AS', as_version)
-        else:
-            create_error(f"The configuration for '{as_version}' does not exist. Check configuration file and make sure an entry for AS version {as_version} exists.", hmi_instance)
-            return as_version, False
-        
-        config_as_data = config.get('AS', 'Data')
+    Args:
+        content (str): Content of the .apj file.
 
-        physical_path = os.path.dirname(file_path) + '/Physical'
-        if not os.path.exists(physical_path):
-            create_error("Can not find the physical folder", hmi_instance)
+    Returns:
+        tuple: (full version like '4.12.5.95 SP', version key of the [AS] section like '4_12'), (None, None) if there is no version.
+    """
+    working_version = re.search(r'AutomationStudio Version="([^"]+)"', content)
+    if not working_version:
+        return None, None
+    as_version = working_version.group(1)
+    parts = as_version.split('.')
+    if len(parts) > 2:
+        as_version = '.'.join(parts[:2]).replace('.', '_')
+    return working_version.group(1), as_version
+
+# Write all planned files into the archives
+def write_archives(config, plan, hmi_instance, executor=None):
+    create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
+    create_log(f"Compress {plan.file_count} files with {format_size(plan.total_bytes)}", hmi_instance)
+
+    DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
+    SEPARATE_UPDATE_FILES = plan.updates is not plan.main
+    INCREMENTAL = config.getboolean('GENERAL', 'incremental', fallback=False)
+    JOBS = get_jobs(config)
+    backend, LEVEL = get_archive_backend(config)
+    if DEBUG_LEVEL > 0 and JOBS > 1:
+        create_log(f"Compressing with {JOBS} jobs", hmi_instance)
+    if DEBUG_LEVEL > 0 and (backend.name != DEFAULT_FORMAT or LEVEL is not None):
+        create_log(f"Archive format {backend.name}, level {backend.default_level if LEVEL is None else LEVEL}: {backend.description}", hmi_instance)
+    if INCREMENTAL and backend.name != DEFAULT_FORMAT:
+        create_log(f"Incremental mode only applies to the {DEFAULT_FORMAT} format, all files are compressed", hmi_instance)
+
+    policy = CompressionPolicy.from_config(config)
+    member_cache = get_member_cache(config)
+    tracker = ProgressTracker(plan.total_bytes, lambda percent, status: report_progress(hmi_instance, percent, status), 0.1 if hmi_instance else 2)
+
+    def write(archive_plan, executor):
+        archive = create_zip_file(archive_plan.output or archive_plan.zip_file_name, SEPARATE_UPDATE_FILES, hmi_instance, policy, INCREMENTAL, config, member_cache, backend, LEVEL, JOBS)
+        if archive is None:
             return False
-
-        # get all configurations
-        for dir_name in os.listdir(physical_path):
+        with archive:
+            archive.progress = tracker.advance
+            if MANIFEST_NAME in archive_plan.generated:
+                archive.hashes = {}
+            if not write_archive(archive, archive_plan, hmi_instance, DEBUG_LEVEL, JOBS, executor):
+                # A failed or cancelled incremental run keeps the previous archive
+                archive.discard()
+                return False
+            return True
+
+    archive_plans = plan.archives
+    if plan.volumes and len(archive_plans) > 1:
+        # Volumes are independent archives, each is written by its own writer at the same time
+        writers = min(len(archive_plans), os.cpu_count() or 1)
+        if DEBUG_LEVEL > 0:
+            create_log(f"Writing {len(archive_plans)} volumes with {writers} writers", hmi_instance)
+        with ExitStack() as pools:
+            if JOBS > 1 and executor is None:
+                executor = pools.enter_context(ThreadPoolExecutor(max_workers=JOBS))
+            pool = pools.enter_context(ThreadPoolExecutor(max_workers=writers))
+            result = all(list(pool.map(share_errors(lambda archive_plan: write(archive_plan, executor)), archive_plans)))
+    else:
+        result = all(write(archive_plan, executor) for archive_plan in archive_plans)
+    if not result:
+        return False
+
+    if member_cache is not None:
+        member_cache.save()
+    tracker.finish()
+    return True
+
+# Write the planned files of one archive
+def write_archive(archive, archive_plan, hmi_instance, DEBUG_LEVEL, JOBS, executor=None):
+    # Upgrades go through the member cache, project files are compressed in parallel
+    for entry in archive_plan:
+        if entry.cache:
             if hmi_instance and hmi_instance.cancelled:
-                create_log(f"Cancelled", hmi_instance) 
+                create_log(f"Cancelled", hmi_instance)
                 return False
+            archive.add_file(entry.file_path, entry.arcname, cache=True)
+            if DEBUG_LEVEL > 1:
+                create_log(f"Added {entry.file_path}", hmi_instance)
 
-            folder_path = os.path.join(physical_path, dir_name)
-            if os.path.isdir(folder_path):
-                if DEBUG_LEVEL > 0:
-                    create_log(f"Found config folder {folder_path}", hmi_instance)
+    entries = ((entry.file_path, entry.arcname, entry.size) for entry in archive_plan if not entry.cache)
+    for file_path, arcname, added in archive.add_files(entries, JOBS, executor):
+        if hmi_instance and hmi_instance.cancelled:
+            create_log(f"Cancelled", hmi_instance)
+            return False
+        if DEBUG_LEVEL > 1:
+            create_log(f"Added {file_path}", hmi_instance)
 
-                # -----------------------------------------------------------------------------------------------------------------------
-                # Read external hardware details
-                for dir_name_plc in os.listdir(folder_path):
-                    folder_path_ext = os.path.join(folder_path, dir_name_plc)
-                    if os.path.isdir(folder_path_ext):
-                        if DEBUG_LEVEL > 1:
-                            create_log(f"Found PLC folder {folder_path_ext}", hmi_instance)
-
-                        if os.path.exists(folder_path_ext + "/ExternalHardware"):
-                            if DEBUG_LEVEL > 0:
-                                create_log(f"Found external hardware folder in {folder_path_ext}", hmi_instance)
-
-                                ExternalHardwareFile = folder_path_ext + "/" + "/ExternalHardware/ExternalHardwareDevices.xml"
-                                if os.path.exists(ExternalHardwareFile):
-                                    content = open_file(ExternalHardwareFile, hmi_instance)
-                                    
-                                    # Load and parse the XML file
-                                    tree = ET.ElementTree(ET.fromstring(content))
-                                    root = tree.getroot()
-
-                                    # Iterate through all Module elements                               
-                                    for module in root.findall('.//Module'):
-                                        if hmi_instance and hmi_instance.cancelled:
-                                            create_log(f"Cancelled", hmi_instance) 
-                                            return False
-
-                                        module_id = module.get('ModuleID')
-                                        module_version = module.get('Version')
-                                        source_file = module.find('SourceFile')
-                                        original_file = source_file.get('OriginalFile') if source_file is not None else 'N/A'
-
-                                        if DEBUG_LEVEL > 0:
-                                            create_log(f'Found external module {module_id}, original file name {original_file}', hmi_instance)
-
-                                        firmware_path = config_as_data + '/AS' + as_version.replace('_', '') + "/Hardware/Modules" + f"/{module_id}" + f"/{module_version}/Source"
-                                        if os.path.exists(firmware_path):
-                                            # Find the exact file name using glob
-                                            search_pattern = firmware_path + f"/{original_file}"
-                                            matching_files = glob.glob(search_pattern)
-
-                                            if matching_files:
-                                                file_name = matching_files[0]  # Take the first match
-                                                if DEBUG_LEVEL > 0:
-                                                    create_log(f"Add external firmware file {file_name}", hmi_instance)
-
-                                                add_zip_file([file_name], updates_file, 'AS/ExternalHardware/Modules' + f"/{module_id}", hmi_instance)
-
-                                            elif DEBUG_LEVEL > 1:
-                                                create_log(f"No external firmware file found for {module_type} and {module_version}", hmi_instance)
-                                elif DEBUG_LEVEL > 0:
-                                    create_log(f"Found external hardware folder but no ExternalHardwareDevices.xml file in {folder_path_ext}", hmi_instance)
-
-                # -----------------------------------------------------------------------------------------------------------------------
-                # Read common hardware details
-                hardware_file = folder_path + "/" + "/Hardware.hw"
-                if not os.path.exists(hardware_file):
-                    create_log(f"Can not find the hardware file in {folder_path}", hmi_instance)
+    # Generated members like manifests are written last, when all files are known
+    for arcname, build in archive_plan.generated.items():
+        archive.add_data(arcname, build(archive))
 
-                else:
-                    content = open_file(folder_path + "/" + "/Hardware.hw", hmi_instance)
+    if DEBUG_LEVEL > 0 and archive.reused:
+        create_log(f"Reused {archive.reused} unchanged files from the previous archive", hmi_instance)
+    return True
+
+# Reduce the plan to the files that were added or changed since the baseline
+def delta_file_handling(config, archive_plan, baseline_file, hmi_instance):
+    create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
+    create_log(f"Compare with baseline {baseline_file}", hmi_instance)
+
+    try:
+        DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
+        hash_cache = get_hash_cache(config)
+        manifest = plan_delta(archive_plan, baseline_file, get_jobs(config), hash_cache)
+        if hash_cache is not None:
+            hash_cache.save()
+        if DEBUG_LEVEL > 1:
+            for kind in ('added', 'changed', 'deleted'):
+                for name in manifest[kind]:
+                    create_log(f"{kind.capitalize()} {name}", hmi_instance)
+        unchanged = len(manifest['files']) - len(manifest['added']) - len(manifest['changed'])
+        create_log(f"Delta: {len(manifest['added'])} added, {len(manifest['changed'])} changed, {len(manifest['deleted'])} deleted, {unchanged} unchanged files", hmi_instance)
+        return True
 
-                    # Placeholder for file handling logic
-                    tree = ET.ElementTree(ET.fromstring(content))
-                    root = tree.getroot()
+    except Exception as e:
+        create_error(f"Failed to compare with the baseline '{baseline_file}': {e}", hmi_instance)
+        return False
 
-                    namespace = {'ns': 'http://br-automation.co.at/AS/Hardware'}
-                    modules = root.findall('.//ns:Module', namespace)
-                    
-                    for module in modules:
-                        if hmi_instance and hmi_instance.cancelled:
-                            create_log(f"Cancelled", hmi_instance) 
-                            return False
+# Plan a manifest member for every archive
+def plan_manifests(config, plan, project_file):
+    hash_cache = get_hash_cache(config)
+    return {archive_plan.zip_file_name: plan_manifest(archive_plan, project_file, hash_cache) for archive_plan in plan.archives}
 
-                        module_type = module.get('Type')
-                        module_version = module.get('Version')
-                        if DEBUG_LEVEL > 1:
-                            create_log(f'Found module type {module_type} with version {module_version}', hmi_instance)
-
-                        if os.path.exists(config_as_path +  "/Upgrades" + f"/{module_type}"):
-                            if os.path.exists(config_as_path +  "/Upgrades" + f"/{module_type}" + f"/{module_version}"):
-                        
-                                # Find the exact file name using glob
-                                search_pattern = config_as_path +  "/Upgrades" + f"/{module_type}" + f"/{module_version}" + f"/*.exe"
-                                matching_files = glob.glob(search_pattern)
-                                if matching_files:
-                                    file_name = matching_files[0]  # Take the first match
-                                    if DEBUG_LEVEL > 0:
-                                        create_log(f"Add firmware file {file_name}", hmi_instance)
-                                    add_zip_file([file_name], updates_file, 'Upgrades', hmi_instance)
-                                elif DEBUG_LEVEL > 1:
-                                    create_log(f"No firmware file found for {module_type} and {module_version}", hmi_instance)
+# Write the manifests of the written archives next to them
+def write_manifests(config, plan, manifests, hmi_instance):
+    try:
+        for archive_plan in plan.archives:
+            if archive_plan.output is not None:
+                create_log(f"Streaming the archive, the manifest is only written as {MANIFEST_NAME} member", hmi_instance)
+                continue
+            sidecar_file = manifest_file_name(archive_plan.zip_file_name)
+            with open(sidecar_file, 'w', encoding='utf-8') as file:
+                json.dump(manifests[archive_plan.zip_file_name], file, indent=2)
+            create_log(f"Manifest written to {sidecar_file}", hmi_instance)
+        hash_cache = get_hash_cache(config)
+        if hash_cache is not None:
+            hash_cache.save()
         return True
     except Exception as e:
-        create_error(f"Failed to process hardware files: {e}", hmi_instance)    
+        create_error(f"Failed to write the manifest: {e}", hmi_instance)
+        return False
+
+# Get the maximum size of a volume in bytes, 0 means the archives are not split
+def get_max_volume_size(config):
+    return parse_size(config.get('GENERAL', 'max_volume_size', fallback='') or 0)
+
+# Split the planned archives into volumes of at most max_size bytes
+def plan_volumes(plan, max_size, hmi_instance, manifest=False):
+    if plan.main.output is not None:
+        create_log(f"Streaming the archive, it is not split into volumes", hmi_instance)
+    oversized = plan.split_volumes(max_size, manifest)
+    for zip_file_name, volumes in plan.volumes.items():
+        create_log(f"Split {os.path.basename(zip_file_name)} into {len(volumes)} volumes of at most {format_size(max_size)}", hmi_instance)
+    for volume in oversized:
+        create_log(f"WARNING: Volume {os.path.basename(volume.zip_file_name)} can exceed {format_size(max_size)}, it holds a single file of {format_size(volume.total_bytes)}", hmi_instance)
+
+# Write the index of the volumes, which volume holds which member
+def write_volume_index(plan, index_file, hmi_instance):
+    try:
+        with open(index_file, 'w', encoding='utf-8') as file:
+            json.dump(plan.volume_index(), file, indent=2)
+        create_log(f"Volume index written to {index_file}", hmi_instance)
+        return True
+    except Exception as e:
+        create_error(f"Failed to write the volume index '{index_file}': {e}", hmi_instance)
+        return False
 
-# Process PLC runtime files
-def cpu_file_handling(config, file_path, updates_file, as_version, hmi_instance):
+# Report the compression progress
+def report_progress(hmi_instance, percent, status):
+    if hmi_instance:
+        hmi_instance.post_event('progress', percent)
+        hmi_instance.post_event('status', status)
+    else:
+        create_log(f"Progress {status}")
+
+# Process project files
+def project_file_handling(config, project_dir, main_plan, hmi_instance):
     create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
-    create_log(f"Add runtime files", hmi_instance)
+    create_log(f"Add project files", hmi_instance)
 
     try:
+        for file_path, arcname, size in walk_project_files(config, project_dir, hmi_instance):
+            if hmi_instance and hmi_instance.cancelled:
+                create_log(f"Cancelled", hmi_instance) 
+                return False
+            main_plan.add_file(file_path, arcname, size)
+        return True
+
+    except Exception as e:
+        create_error(f"Failed to process project files: {e}", hmi_instance)
+
+# Find all project files that go into the archive
+def walk_project_files(config, project_dir, hmi_instance):
+    DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
+    matcher = PathMatcher.from_config(config, project_dir)
+    if DEBUG_LEVEL > 1:
+        create_log(f"Exclude patterns: {matcher.exclude}, include patterns: {matcher.include}", hmi_instance)
+
+    def skipped(arcname):
+        if DEBUG_LEVEL > 1:
+            create_log(f"Removed folder: {arcname}", hmi_instance)
+
+    cancelled = (lambda: hmi_instance.cancelled) if hmi_instance else None
+    return walk_project(project_dir, matcher, cancelled, skipped)
+
+# Get the number of compression jobs, 0 means one job per CPU core
+def get_jobs(config):
+    jobs = config.getint('GENERAL', 'jobs', fallback=1)
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+# Process the PLC configurations, this are the runtime and firmware files
+def physical_file_handling(config, file_path, updates_plan, as_version, hmi_instance, upgrade_index=None):
+    try:
+        if upgrade_index is None:
+            upgrade_index = get_upgrade_index(config)
+
         # Read the configuration file
         DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
+        INCLUDE_RUNTIME_UPDATES = config.getboolean('GENERAL', 'include_runtime_updates', fallback=True)
+        INCLUDE_HARDWARE_UPDATES = config.getboolean('GENERAL', 'include_hardware_updates', fallback=True)
+        if not INCLUDE_RUNTIME_UPDATES and not INCLUDE_HARDWARE_UPDATES:
+            return True
 
         if config.has_option('AS', as_version):
             config_as_path = config.get('AS', as_version)
         else:
             create_error(f"The configuration for '{as_version}' does not exist. Check configuration file and make sure an entry for AS version {as_version} exists.", hmi_instance)
-            return as_version, False
+            return False
 
         if config.has_option('AS', as_version + '_base'):
             config_base_path = config.get('AS', as_version + '_base')
-        else:
+        elif INCLUDE_RUNTIME_UPDATES:
             create_error(f"The configuration for '{as_version}_base')' does not exist. Check configuration file and make sure an entry for AS version {as_version}_base') exists.", hmi_instance)
-            return as_version, False
-    
-        if 'TRANSLATE' in config:
-            translate_dict = dict(config.items('TRANSLATE'))
-            translate_dict = {key.upper(): value.upper() for key, value in translate_dict.items()}
+            return False
+
+        config_as_data = config.get('AS', 'Data')
 
-        physical_path = os.path.dirname(file_path) + '/Physical'
+        translator = get_cpu_translator(config)
+
+        project_dir = os.path.dirname(file_path)
+        physical_path = project_dir + '/Physical'
         if not os.path.exists(physical_path):
             create_error("Can not find the physical folder", hmi_instance)
             return False
 
-        # get all configurations
-        for dir_name in os.listdir(physical_path):
-            if hmi_instance and hmi_instance.cancelled:
-                create_log(f"Cancelled", hmi_instance) 
-                return False
+        # Read all configurations at once, the files of every configuration are only opened once
+        scans = []
+        with profile_phase('configuration_scan'):
+            for scan in scan_physical(physical_path, get_scan_jobs(config), INCLUDE_RUNTIME_UPDATES, INCLUDE_HARDWARE_UPDATES):
+                if hmi_instance and hmi_instance.cancelled:
+                    create_log(f"Cancelled", hmi_instance) 
+                    return False
+                scans.append(scan)
+        artifacts = UpgradeArtifacts()
 
-            folder_path = os.path.join(physical_path, dir_name)
-            if os.path.isdir(folder_path):
-                if DEBUG_LEVEL > 1:
-                    create_log(f"Found config folder {folder_path}", hmi_instance)
+        # -----------------------------------------------------------------------------------------------------------------------
+        # Find the runtime and VC files
+        if INCLUDE_RUNTIME_UPDATES:
+            with profile_phase('runtime_lookup'):
+                create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
+                create_log(f"Add runtime files", hmi_instance)
 
-                folders = [name for name in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, name))]
-                if folders:
-                    content = open_file(folder_path + "/" + folders[0] + "/Cpu.pkg", hmi_instance)
+                for scan in scans:
+                    if DEBUG_LEVEL > 1:
+                        create_log(f"Found config folder {scan.folder_path}", hmi_instance)
+                    if not scan.cpu_type:
+                        continue
+
+                    cpu_type = scan.cpu_type
+                    if DEBUG_LEVEL > 1:
+                        create_log(f"CPU type is {cpu_type}", hmi_instance)
+
+                    # Check if any entry from TRANSLATE is in cpu_type
+                    substitute = translator.translate(cpu_type)
+                    if substitute:
+                        cpu_type = substitute
+                        if DEBUG_LEVEL > 1:
+                            create_log(f"Found substitute CPU type is {cpu_type}", hmi_instance)
 
-                    module_id = re.search(r'Configuration ModuleId="([^"]+)"', content)
-                    if module_id:
-                        cpu_type = module_id.group(1)
+                    # Get the runtime version
+                    if scan.runtime_version:
+                        parts = scan.runtime_version.split('.')
+                        major_version = parts[0][1:].zfill(2)
+                        runtime_version = f'{parts[0][0:1]}{major_version}{parts[1]}'
                         if DEBUG_LEVEL > 1:
-                            create_log(f"CPU type is {cpu_type}", hmi_instance)
-
-                        # Check if any entry from TRANSLATE is in cpu_type
-                        for key, value in translate_dict.items():
-                            pattern = re.compile(key)
-                            if pattern.match(cpu_type):
-                                cpu_type = value
-                                if DEBUG_LEVEL > 1:
-                                    create_log(f"Found substitute CPU type is {cpu_type}", hmi_instance)
-                                break
-
-                        # Get the runtime version
-                        runtime_version = re.search(r'AutomationRuntime Version="([^"]+)"', content)
-                        if runtime_version:
-                            parts = runtime_version.group(1).split('.')
-                            major_version = parts[0][1:].zfill(2)
-                            runtime_version = f'{parts[0][0:1]}{major_version}{parts[1]}'
+                            create_log(f"Runtime version is {runtime_version}", hmi_instance)
+
+                        # Find the exact file name in the upgrade index
+                        file_name = upgrade_index.find_runtime(config_base_path, runtime_version, cpu_type)
+                        if file_name:
+                            origin = describe_origin(project_dir, scan.cpu_file, f"AutomationRuntime {scan.runtime_version} on {scan.cpu_type}")
+                            if artifacts.add('runtime', file_name, origin=[origin]) and DEBUG_LEVEL > 0:
+                                create_log(f"Add runtime file {file_name}", hmi_instance)
+                        else:
+                            updates_plan.add_missing(f"runtime {runtime_version} for {cpu_type}")
                             if DEBUG_LEVEL > 1:
-                                create_log(f"Runtime version is {runtime_version}", hmi_instance)
-
-                            # Find the exact file name using glob
-                            search_pattern = os.path.join(config_base_path, "Upgrades", f"*AR_{runtime_version}_{cpu_type}*.exe")
-                            matching_files = glob.glob(search_pattern)
-                            if matching_files:
-                                file_name = matching_files[0]  # Take the first match
-                                if DEBUG_LEVEL > 0:
-                                    create_log(f"Add runtime file {file_name}", hmi_instance)
-                                add_zip_file([file_name], updates_file, 'Upgrades', hmi_instance)
-                            elif DEBUG_LEVEL > 1:
                                 create_log(f"No runtime file found for {runtime_version} and {cpu_type}", hmi_instance)
 
-                        if hmi_instance and hmi_instance.cancelled:
-                            create_log(f"Cancelled", hmi_instance) 
-                            return False
-                        
-                        # Get the vc version
-                        vc_version = re.search(r'Vc FirmwareVersion="([^"]+)"', content)
-                        if vc_version:
-                            vc_version = vc_version.group(1)
-                            create_log(f"VC version is {vc_version}", hmi_instance)
-
-                            # Find the exact file name using glob
-                            search_pattern = os.path.join(config_as_path, "Upgrades", f"*VC_{vc_version}*.exe")
-                            matching_files = glob.glob(search_pattern)
-                            if matching_files:
-                                file_name = matching_files[0]  # Take the first match
-                                if DEBUG_LEVEL > 0:
-                                    create_log(f"Add VC file {file_name}", hmi_instance)
-                                add_zip_file([file_name], updates_file, 'Upgrades', hmi_instance)    
-                            elif DEBUG_LEVEL > 1:
+                    # Get the vc version
+                    if scan.vc_version:
+                        vc_version = scan.vc_version
+                        create_log(f"VC version is {vc_version}", hmi_instance)
+
+                        # Find the exact file name in the upgrade index
+                        file_name = upgrade_index.find_vc(config_as_path, vc_version)
+                        if file_name:
+                            origin = describe_origin(project_dir, scan.cpu_file, f"Vc {vc_version}")
+                            if artifacts.add('vc', file_name, origin=[origin]) and DEBUG_LEVEL > 0:
+                                create_log(f"Add VC file {file_name}", hmi_instance)
+                        else:
+                            updates_plan.add_missing(f"VC {vc_version}")
+                            if DEBUG_LEVEL > 1:
                                 create_log(f"No VC file found for {vc_version}", hmi_instance)
-        return True                                   
-           
+
+                if DEBUG_LEVEL > 1:
+                    create_log(f"TRANSLATE rule statistics {translator.stats()}", hmi_instance)
+
+        # -----------------------------------------------------------------------------------------------------------------------
+        # Find the firmware files of the hardware and external hardware modules
+        if INCLUDE_HARDWARE_UPDATES:
+            with profile_phase('hardware_lookup'):
+                create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
+                create_log(f"Add hardware files", hmi_instance)
+
+                # Collect the distinct modules of all configurations, so every module is only looked up once
+                external_modules = Counter()
+                modules = Counter()
+                # Remember the files of the configurations that use a module
+                module_sources = {}
+                for scan in scans:
+                    if DEBUG_LEVEL > 0:
+                        create_log(f"Found config folder {scan.folder_path}", hmi_instance)
+                    external_modules.update(scan.external_modules)
+                    for module in dict.fromkeys(scan.external_modules):
+                        module_sources.setdefault(module, []).append(scan.folder_path)
+                    if scan.modules is None:
+                        create_log(f"Can not find the hardware file in {scan.folder_path}", hmi_instance)
+                    else:
+                        modules.update(scan.modules)
+                        for module in dict.fromkeys(scan.modules):
+                            module_sources.setdefault(module, []).append(os.path.join(scan.folder_path, 'Hardware.hw'))
+
+                modules_path = config_as_data + '/AS' + as_version.replace('_', '') + "/Hardware/Modules"
+                for (module_id, module_version, original_file), count in external_modules.items():
+                    if hmi_instance and hmi_instance.cancelled:
+                        create_log(f"Cancelled", hmi_instance) 
+                        return False
+                    if DEBUG_LEVEL > 0:
+                        create_log(f'Found external module {module_id}, original file name {original_file}, used {count} times', hmi_instance)
+
+                    # Find the exact file name in the upgrade index
+                    file_name = upgrade_index.find_external(modules_path, module_id, module_version, original_file)
+                    if file_name:
+                        origin = [describe_origin(project_dir, source, f"ExternalHardwareDevices.xml {module_id} {module_version} ({original_file})") for source in module_sources[(module_id, module_version, original_file)]]
+                        if artifacts.add('external', file_name, 'AS/ExternalHardware/Modules' + f"/{module_id}", origin) and DEBUG_LEVEL > 0:
+                            create_log(f"Add external firmware file {file_name}", hmi_instance)
+                    else:
+                        updates_plan.add_missing(f"external firmware {module_id} {module_version} ({original_file})")
+                        if DEBUG_LEVEL > 1:
+                            create_log(f"No external firmware file found for {module_id} and {module_version}", hmi_instance)
+
+                for (module_type, module_version), count in modules.items():
+                    if hmi_instance and hmi_instance.cancelled:
+                        create_log(f"Cancelled", hmi_instance) 
+                        return False
+                    if DEBUG_LEVEL > 1:
+                        create_log(f'Found module type {module_type} with version {module_version}, used {count} times', hmi_instance)
+
+                    # Find the exact file name in the upgrade index
+                    file_name = upgrade_index.find_firmware(config_as_path, module_type, module_version)
+                    if file_name:
+                        origin = [describe_origin(project_dir, source, f"{module_type} {module_version}") for source in module_sources[(module_type, module_version)]]
+                        if artifacts.add('firmware', file_name, origin=origin) and DEBUG_LEVEL > 0:
+                            create_log(f"Add firmware file {file_name}", hmi_instance)
+                    else:
+                        updates_plan.add_missing(f"firmware {module_type} {module_version}")
+                        if DEBUG_LEVEL > 1:
+                            create_log(f"No firmware file found for {module_type} and {module_version}", hmi_instance)
+
+                create_log(f"Found {sum(modules.values())} modules of {len(modules)} types and {sum(external_modules.values())} external modules of {len(external_modules)} types, "
+                           f"{artifacts.count('firmware')} firmware and {artifacts.count('external')} external firmware files", hmi_instance)
+
+        # Hand the required upgrades over to the archive
+        for kind, file_name, zip_path, origin in artifacts:
+            add_zip_file([file_name], updates_plan, zip_path, hmi_instance, origin)
+        return True
+
     except Exception as e:
-        create_error(f"Failed to process runtime files: {e}", hmi_instance)
+        create_error(f"Failed to process configuration files: {e}", hmi_instance)
+
+# Describe the project entry that requires an upgrade, e.g. 'Physical/Config1/Hardware.hw: X20DI9371 1.1.0.0'
+def describe_origin(project_dir, file_path, entry):
+    return f"{os.path.relpath(file_path, project_dir or os.curdir).replace(os.sep, '/')}: {entry}"
+
+# Get the number of configurations scanned in parallel
+def get_scan_jobs(config):
+    jobs = config.getint('GENERAL', 'scan_jobs', fallback=1)
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
 
 # Process project apj file
-def tech_file_handling(config, updates_file, hmi_instance, content):
+def tech_file_handling(config, updates_plan, hmi_instance, content, upgrade_index=None, project_file='Project.apj'):
     create_log(f"--------------------------------------------------------------------------------------------------------------------------------------------", hmi_instance)
     create_log(f"Find AS version", hmi_instance)
 
     try:
+        if upgrade_index is None:
+            upgrade_index = get_upgrade_index(config)
+
         # Read the configuration file
         DEBUG_LEVEL = int(config.get('GENERAL', 'debug_level'))
         INCLUDE_AS_UPDATES = config.getboolean('GENERAL', 'include_as_updates', fallback=False)
@@ -365,12 +613,8 @@ def tech_file_handling(config, updates_file, hmi_instance, content):
         root = tree.getroot()
 
         # Find AS version
-        working_version = re.search(r'AutomationStudio Version="([^"]+)"', content)
-        if working_version:
-            as_version = working_version.group(1)
-            parts = as_version.split('.')
-            if len(parts) > 2:
-                as_version = '.'.join(parts[:2]).replace('.', '_')
+        full_version, as_version = read_as_version(content)
+        if full_version:
             if DEBUG_LEVEL > 0:
                 create_log(f"AS version is {as_version}", hmi_instance)
     
@@ -390,21 +634,22 @@ def tech_file_handling(config, updates_file, hmi_instance, content):
 
         # Include automation studio update files
         if INCLUDE_AS_UPDATES:
-            sp_version = working_version.group(1)
+            sp_version = full_version
             if "SP" in sp_version:
                 sp_version = sp_version.replace(" SP", "_SP")
                 if DEBUG_LEVEL > 1:
                     create_log(f"AS is using service pack {sp_version}", hmi_instance)
 
-                search_pattern = os.path.join(config_as_path, "Upgrades", "AS" + as_version[0:1] + f"_AS_{sp_version}*.exe")
-                matching_files = glob.glob(search_pattern)
-                if matching_files:
-                    file_name = matching_files[0]  # Take the first match
+                file_name = upgrade_index.find_service_pack(config_as_path, as_version[0:1], sp_version)
+                if file_name:
                     if DEBUG_LEVEL > 1:
                         create_log(f"Add service pack file {file_name}", hmi_instance)
-                    add_zip_file([file_name], updates_file, 'Upgrades', hmi_instance)
-                elif DEBUG_LEVEL > 0:
-                    create_log(f"WARNING: No file found for service pack version {sp_version}", hmi_instance)
+                    origin = describe_origin(os.path.dirname(project_file), project_file, f"AutomationStudio {full_version}")
+                    add_zip_file([file_name], updates_plan, 'Upgrades', hmi_instance, [origin])
+                else:
+                    updates_plan.add_missing(f"service pack {sp_version}")
+                    if DEBUG_LEVEL > 0:
+                        create_log(f"WARNING: No file found for service pack version {sp_version}", hmi_instance)
 
         if hmi_instance and hmi_instance.cancelled:
             create_log(f"Cancelled", hmi_instance) 
@@ -437,16 +682,17 @@ def tech_file_handling(config, updates_file, hmi_instance, content):
                 if DEBUG_LEVEL > 0:
                     create_log(f"Found technology package {name} version {version}", hmi_instance)
 
-                # Find the exact file name using glob            
-                search_pattern = os.path.join(config_as_path, "Upgrades", "AS" + as_version[0:1] + f"_TP_{name}_{version}*.exe")
-                matching_files = glob.glob(search_pattern)
-                if matching_files:
-                    file_name = matching_files[0]  # Take the first match
+                # Find the exact file name in the upgrade index
+                file_name = upgrade_index.find_technology(config_as_path, as_version[0:1], name, version)
+                if file_name:
                     if DEBUG_LEVEL > 1:
                         create_log(f"Add technology file {file_name}", hmi_instance)
-                    add_zip_file([file_name], updates_file, 'Upgrades', hmi_instance)
-                elif DEBUG_LEVEL > 0:
-                    create_log(f"WARNING: No file found for technology package {name} version {version}", hmi_instance)
+                    origin = describe_origin(os.path.dirname(project_file), project_file, f"TechnologyPackage {name} {version}")
+                    add_zip_file([file_name], updates_plan, 'Upgrades', hmi_instance, [origin])
+                else:
+                    updates_plan.add_missing(f"technology package {name} {version}")
+                    if DEBUG_LEVEL > 0:
+                        create_log(f"WARNING: No file found for technology package {name} version {version}", hmi_instance)
 
         return as_version, True
     except Exception as e:
@@ -455,58 +701,49 @@ def tech_file_handling(config, updates_file, hmi_instance, content):
 # Generic open file function
 def open_file(file_path, hmi_instance):
     try:
-        with open(file_path, 'rb') as file:
-            raw_data = file.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding']
-        
-        with open(file_path, 'r', encoding=encoding) as file:
-            content = file.read()
-        return content.replace('\n', '')
+        return read_text(file_path).replace('\n', '')
     except Exception as e:
         create_error(f"Failed to open file '{file_path}': {e}", hmi_instance)
 
-# Create a zip file
-def create_zip_file(zip_file_name, SEPARATE_UPDATE_FILES, hmi_instance):
+# Create a zip file, or an archive of another format of the backend
+def create_zip_file(zip_file_name, SEPARATE_UPDATE_FILES, hmi_instance, policy=None, INCREMENTAL=False, config=None, member_cache=None, backend=None, level=None, jobs=1):
     try:
-        with zipfile.ZipFile(zip_file_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            if not SEPARATE_UPDATE_FILES:
-                zipf.writestr('Upgrades/', '')  # Create an empty directory named 'upgrades'
+        previous = archive = None
+        backend = backend or BACKENDS[DEFAULT_FORMAT]
+        # Keep the last archive to copy unchanged files from it
+        if INCREMENTAL and backend.name == DEFAULT_FORMAT and isinstance(zip_file_name, str) and os.path.exists(zip_file_name):
+            previous = zip_file_name + ".previous"
+            os.replace(zip_file_name, previous)
+        compare_crc = config.getboolean('GENERAL', 'incremental_crc', fallback=False) if config else False
+        archive = open_archive(backend, zip_file_name, level, jobs, policy=policy, previous=previous, compare_crc=compare_crc, member_cache=member_cache)
+        if not SEPARATE_UPDATE_FILES:
+            archive.add_directory('Upgrades/')  # Create an empty directory named 'upgrades'
+        return archive
     except Exception as e:
-        create_error(f"Failed to create zip file '{zip_file_name}': {e}", hmi_instance)
-
-# Add files to a zip file
-def add_zip_file(file_paths, zip_file_name, zip_path, hmi_instance):
+        # Put the previous archive back
+        if archive is not None:
+            archive.discard()
+        elif previous and os.path.exists(previous):
+            os.replace(previous, zip_file_name)
+        create_error(f"Failed to create zip file '{getattr(zip_file_name, 'name', zip_file_name)}': {e}", hmi_instance)
+
+# Add upgrade files to the plan of a zip file, origin lists the project entries that require them
+def add_zip_file(file_paths, archive, zip_path, hmi_instance, origin=None):
     try:
-        with zipfile.ZipFile(zip_file_name, 'a', zipfile.ZIP_DEFLATED) as zipf:
-            existing_files = set(zipf.namelist())
-            for file_path in file_paths:
-                arcname = f'{zip_path}/{os.path.basename(file_path)}'
-                if arcname not in existing_files:
-                    zipf.write(file_path, arcname)
+        for file_path in file_paths:
+            archive.add_file(file_path, f'{zip_path}/{os.path.basename(file_path)}', cache=True, origin=origin)
     except Exception as e:
-        create_error(f"Failed to add file to zip '{zip_file_name}': {e}", hmi_instance) 
+        create_error(f"Failed to add file to zip '{archive.zip_file_name}': {e}", hmi_instance) 
 
 # Create log messages entries
 def create_log(log_text, hmi_instance=None):
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{current_time} - {log_text}"
-
-    if hmi_instance:
-        hmi_instance.log_text.configure(state="normal")  # Enable editing temporarily
-        hmi_instance.log_text.insert("end", log_entry + "\n")    # Insert the new log entry
-        hmi_instance.log_text.configure(state="disabled") # Disable editing again
-        hmi_instance.log_text.see("end") # Autoscroll to the end
-        
-        # Refresh the window
-        hmi_instance.master.update()
-    else:
-        print(log_entry)
+    get_log_buffer()
+    logger.info(log_text)
 
 # Create error messages entries
 def create_error(error_text, hmi_instance=None):
     """
-    Creates a popup with the provided error text.
+    Logs the provided error text and shows it in a popup when running with GUI.
 
     Args:
         error_text (str): The error text to be displayed.
@@ -514,10 +751,7 @@ def create_error(error_text, hmi_instance=None):
     Returns:
         None
     """
+    get_log_buffer()
+    logger.error(f"ERROR: {error_text}")
     if hmi_instance:
-        create_log(f"ERROR: {error_text}")
-        messagebox.showerror("Error", error_text)
-    else:
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{current_time} - {error_text}\n"
-        print(log_entry)
+        hmi_instance.post_event('error', error_text)
@@ -0,0 +1,176 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.upgrade_index import get_cache_dir
+
+HASH_CACHE_FILE = 'hashes.json'
+CACHE_VERSION = 2
+CHUNK_SIZE = 1024 * 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def hash_file(file_path):
+    """
+    Calculate the SHA-256 and the CRC32 of a file in one read pass.
+
+    Args:
+        file_path (str): Path of the file.
+
+    Returns:
+        dict: 'size', 'crc32' as 8 hex digits and 'sha256' as hex digest.
+    """
+    sha256 = hashlib.sha256()
+    crc = 0
+    size = 0
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return file_hash(size, crc, sha256.hexdigest())
+
+def file_hash(size, crc, sha256):
+    # Hash entry as stored in the cache and the manifests
+    return {'size': size, 'crc32': f"{crc:08x}", 'sha256': sha256}
+
+# Get the shared hash cache for the configured cache directory
+def get_hash_cache(config):
+    """
+    Get the file hash cache for a configuration.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+
+    Returns:
+        HashCache: The hash cache, None if it is disabled.
+    """
+    if not config.getboolean('CACHE', 'hash_cache', fallback=True):
+        return None
+    cache_file = os.path.join(get_cache_dir(config), HASH_CACHE_FILE)
+    with _caches_lock:
+        if cache_file not in _caches:
+            _caches[cache_file] = HashCache(cache_file)
+        return _caches[cache_file]
+
+class HashCache:
+    """
+    Local cache of the SHA-256 and CRC32 of files.
+
+    There is one entry per source path with the size and modification time the file
+    had when it was hashed, so unchanged upgrades are hashed once and not read again
+    on later runs. A changed file replaces its entry, and files that no longer exist
+    are dropped when the cache is saved.
+
+    Args:
+        cache_file (str): Path of the JSON cache file.
+    """
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        Write the cache file if it changed, without the files that no longer exist.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            paths = list(self.entries)
+        removed = [path for path in paths if not os.path.exists(path)]
+        with self.lock:
+            for path in removed:
+                self.entries.pop(path, None)
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            temp_file = self.cache_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump({'version': CACHE_VERSION, 'entries': self.entries}, file)
+            os.replace(temp_file, self.cache_file)
+            self.dirty = False
+
+    def _key(self, file_path):
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def get(self, file_path):
+        """
+        Get the cached hashes of a file.
+
+        Args:
+            file_path (str): Path of the file.
+
+        Returns:
+            dict: The hashes, see hash_file(), None if the file is not cached.
+        """
+        st = os.stat(file_path)
+        with self.lock:
+            entry = self.entries.get(self._key(file_path))
+        if not entry or entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+            return None
+        return {'size': entry['size'], 'crc32': entry['crc32'], 'sha256': entry['sha256']}
+
+    def put(self, file_path, hashes):
+        """
+        Store the hashes of a file.
+
+        Args:
+            file_path (str): Path of the file.
+            hashes (dict): The hashes, see hash_file().
+        """
+        st = os.stat(file_path)
+        entry = dict(hashes, mtime_ns=st.st_mtime_ns)
+        with self.lock:
+            self.entries[self._key(file_path)] = entry
+            self.dirty = True
+
+    def hash_file(self, file_path):
+        """
+        Get the hashes of a file from the cache, hashing it on a miss.
+
+        Args:
+            file_path (str): Path of the file.
+
+        Returns:
+            dict: The hashes, see hash_file().
+        """
+        hashes = self.get(file_path)
+        if hashes is None:
+            hashes = hash_file(file_path)
+            self.put(file_path, hashes)
+        return hashes
+
+def hash_files(file_paths, jobs=1, cache=None):
+    """
+    Hash several files, optionally in parallel.
+
+    Args:
+        file_paths (iterable): Paths of the files.
+        jobs (int): Number of worker threads.
+        cache (HashCache): Cache of known hashes, None hashes every file.
+
+    Returns:
+        dict: Hashes per file path, see hash_file().
+    """
+    file_paths = list(dict.fromkeys(file_paths))
+    function = cache.hash_file if cache is not None else hash_file
+    if jobs <= 1:
+        return {file_path: function(file_path) for file_path in file_paths}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(file_paths, executor.map(function, file_paths)))
@@ -0,0 +1,68 @@
+import xml.etree.ElementTree as ET
+
+HARDWARE_NAMESPACE = 'http://br-automation.co.at/AS/Hardware'
+HARDWARE_MODULE_TAG = f'{{{HARDWARE_NAMESPACE}}}Module'
+EXTERNAL_MODULE_TAG = 'Module'
+
+def iter_elements(file_path, tag):
+    """
+    Stream the elements with a tag from an XML file.
+
+    The file is parsed incrementally. Finished elements are cleared and removed from
+    their parent, so the memory used does not grow with the size of the file. An
+    element is yielded once it is complete, its children are only valid until the
+    generator continues.
+
+    Args:
+        file_path (str): Path of the XML file.
+        tag (str): Tag of the elements, '{namespace}name' for namespaced elements.
+
+    Yields:
+        xml.etree.ElementTree.Element: The complete element.
+    """
+    stack = []
+    # Number of open elements with the tag, their children must be kept until they end
+    depth = 0
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag == tag:
+                depth += 1
+            continue
+
+        stack.pop()
+        if elem.tag == tag:
+            depth -= 1
+            yield elem
+        if depth == 0:
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+def iter_hardware_modules(file_path):
+    """
+    Stream the modules of a Hardware.hw file.
+
+    Args:
+        file_path (str): Path of the Hardware.hw file.
+
+    Yields:
+        tuple: (module type, module version)
+    """
+    for module in iter_elements(file_path, HARDWARE_MODULE_TAG):
+        yield module.get('Type'), module.get('Version')
+
+def iter_external_modules(file_path):
+    """
+    Stream the modules of an ExternalHardwareDevices.xml file.
+
+    Args:
+        file_path (str): Path of the ExternalHardwareDevices.xml file.
+
+    Yields:
+        tuple: (module ID, module version, original file name or 'N/A')
+    """
+    for module in iter_elements(file_path, EXTERNAL_MODULE_TAG):
+        source_file = module.find('SourceFile')
+        original_file = source_file.get('OriginalFile') if source_file is not None else 'N/A'
+        yield module.get('ModuleID'), module.get('Version'), original_file
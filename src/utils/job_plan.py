@@ -0,0 +1,310 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+from collections import namedtuple
+from utils.archive_backends import strip_archive_extension
+
+# A file that goes into an archive, upgrades are marked with cache=True and list the project entries that require them in origin
+PlanEntry = namedtuple('PlanEntry', ['file_path', 'arcname', 'size', 'cache', 'origin'])
+
+# Bytes reserved per member of a volume for its ZIP headers or tar header blocks
+VOLUME_MEMBER_OVERHEAD = 1024
+
+# Bytes reserved per volume for the end of the archive and the directory entries
+VOLUME_ARCHIVE_OVERHEAD = 16 * 1024
+
+# Bytes reserved per file for its entry in the MANIFEST.json of a volume, besides its paths
+MANIFEST_ENTRY_OVERHEAD = 256
+
+# Bytes reserved per volume for the MANIFEST.json member, its header and the fields outside the file list
+MANIFEST_ARCHIVE_OVERHEAD = 4 * 1024
+
+def volume_size(entry, manifest=False):
+    """
+    Get the largest size a file can take in a volume.
+
+    The size is the worst case of DEFLATE on incompressible data plus the headers,
+    so a volume packed with these sizes stays below its limit once compressed. With
+    manifests, the uncompressed size of the entry of the file in MANIFEST.json is added.
+
+    Args:
+        entry (PlanEntry): The planned file.
+        manifest (bool): Every volume gets a MANIFEST.json.
+
+    Returns:
+        int: Size in bytes.
+    """
+    size = entry.size + (entry.size >> 12) + (entry.size >> 14) + VOLUME_MEMBER_OVERHEAD + 2 * len(entry.arcname.encode('utf-8'))
+    if manifest:
+        # JSON escapes non-ASCII characters, so the encoded strings are measured
+        paths = [entry.arcname, os.path.abspath(entry.file_path)] + list(entry.origin)
+        size += MANIFEST_ENTRY_OVERHEAD + sum(len(json.dumps(path)) + 16 for path in paths)
+    return size
+
+def archive_overhead(manifest=False):
+    # Bytes reserved per volume besides its files
+    return VOLUME_ARCHIVE_OVERHEAD + (MANIFEST_ARCHIVE_OVERHEAD if manifest else 0)
+
+def pack_volumes(entries, max_size, manifest=False):
+    """
+    Pack files into volumes with first fit decreasing bin packing.
+
+    Args:
+        entries (list): PlanEntry of every file.
+        max_size (int): Maximum size of a volume in bytes.
+        manifest (bool): Reserve the space of a MANIFEST.json in every volume.
+
+    Returns:
+        list: A list of PlanEntry per volume, in the order of entries. A file that does
+        not fit into an empty volume gets a volume of its own.
+    """
+    capacity = max_size - archive_overhead(manifest)
+    sizes = [volume_size(entry, manifest) for entry in entries]
+    volumes = []
+    for index in sorted(range(len(entries)), key=lambda index: -sizes[index]):
+        for volume in volumes:
+            if volume[0] >= sizes[index]:
+                volume[0] -= sizes[index]
+                volume[1].append(index)
+                break
+        else:
+            volumes.append([capacity - sizes[index], [index]])
+    return [[entries[index] for index in sorted(indices)] for _, indices in volumes]
+
+class ArchivePlan:
+    """
+    Files planned for one archive, in the order they are written.
+
+    Has the same add_file signature as ArchiveWriter, so the file handlers can
+    collect their files into the plan before anything is compressed.
+
+    Args:
+        zip_file_name (str): Path of the ZIP file, the name of the stream when output is set.
+        output (StreamOutput): Stream the archive is written to instead of the ZIP file.
+    """
+    def __init__(self, zip_file_name, output=None):
+        self.zip_file_name = zip_file_name
+        self.output = output
+        self.entries = {}
+        self.generated = {}
+        self.missing = []
+
+    def __contains__(self, arcname):
+        return arcname in self.entries
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add_file(self, file_path, arcname, size=None, cache=False, origin=None):
+        """
+        Plan a file for the archive unless a member with the same name is planned.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            arcname (str): Name of the member inside the archive.
+            size (int): Size of the file, None reads it from the file system.
+            cache (bool): Use the member cache when writing the file.
+            origin (list): Project entries that require the file, e.g. 'Hardware.hw X20DI9371 1.1.0.0'.
+                They are added to the origin of a planned member with the same name.
+
+        Returns:
+            bool: True if the file was planned, False if it was already in the plan.
+        """
+        if arcname in self.entries:
+            planned = self.entries[arcname].origin
+            planned.extend(item for item in origin or [] if item not in planned)
+            return False
+        if size is None:
+            size = os.path.getsize(file_path)
+        self.entries[arcname] = PlanEntry(file_path, arcname, size, cache, list(origin or []))
+        return True
+
+    def add_generated(self, arcname, build):
+        """
+        Plan a member whose content is created when the archive is written, after all files.
+
+        Args:
+            arcname (str): Name of the member inside the archive.
+            build (callable): Gets the archive writer and returns the content of the member as bytes.
+        """
+        self.generated[arcname] = build
+
+    def add_missing(self, description):
+        """
+        Record an upgrade that is required but was not found.
+
+        Args:
+            description (str): Description of the upgrade, e.g. 'runtime B4.93 for X20CP04XX'.
+        """
+        if description not in self.missing:
+            self.missing.append(description)
+
+    @property
+    def total_bytes(self):
+        return sum(entry.size for entry in self.entries.values())
+
+class JobPlan:
+    """
+    Manifest of all files of a zipping job.
+
+    Args:
+        main_file (str): Path of the main ZIP file.
+        updates_file (str): Path of the separate updates ZIP file, None puts the updates into the main file.
+        output (StreamOutput): Stream the main archive is written to instead of the main ZIP file.
+    """
+    def __init__(self, main_file, updates_file=None, output=None):
+        self.main = ArchivePlan(main_file, output)
+        self.updates = ArchivePlan(updates_file) if updates_file else self.main
+        self.volumes = {}
+        self.max_volume_size = 0
+
+    @property
+    def planned_archives(self):
+        # Updates are written first, like they are found
+        return [self.updates, self.main] if self.updates is not self.main else [self.main]
+
+    @property
+    def archives(self):
+        # Archives that are split are replaced by their volumes
+        return [volume for archive in self.planned_archives for volume in self.volumes.get(archive.zip_file_name, [archive])]
+
+    def split_volumes(self, max_size, manifest=False):
+        """
+        Split the archives that may get larger than max_size into volumes.
+
+        Every volume is a complete archive of its own, named like the archive with
+        '_Part01', '_Part02', ... before the extension. Streamed archives are not split.
+
+        Args:
+            max_size (int): Maximum size of a volume in bytes.
+            manifest (bool): Reserve the space of the MANIFEST.json that is planned for every volume.
+
+        Returns:
+            list: The volumes that are larger than max_size because of a single large file.
+        """
+        self.max_volume_size = max_size
+        oversized = []
+        for archive in self.planned_archives:
+            entries = list(archive)
+            if archive.output is not None or sum(volume_size(entry, manifest) for entry in entries) + archive_overhead(manifest) <= max_size:
+                continue
+            base = strip_archive_extension(archive.zip_file_name)
+            extension = archive.zip_file_name[len(base):]
+            volumes = []
+            for number, volume_entries in enumerate(pack_volumes(entries, max_size, manifest), 1):
+                volume = ArchivePlan(f"{base}_Part{number:02d}{extension}")
+                volume.entries = {entry.arcname: entry for entry in volume_entries}
+                if sum(volume_size(entry, manifest) for entry in volume_entries) + archive_overhead(manifest) > max_size:
+                    oversized.append(volume)
+                volumes.append(volume)
+            # Generated members like manifests go into the first volume
+            volumes[0].generated = dict(archive.generated)
+            self.volumes[archive.zip_file_name] = volumes
+        return oversized
+
+    def volume_index(self):
+        """
+        Get the index of the volumes, which volume holds which member.
+
+        Returns:
+            dict: JSON compatible index with the volumes of every split archive.
+        """
+        return {
+            'max_volume_size': self.max_volume_size,
+            'archives': {os.path.basename(name): [{
+                'volume': os.path.basename(volume.zip_file_name),
+                'files': len(volume),
+                'bytes_in': volume.total_bytes,
+                'members': [entry.arcname for entry in volume],
+            } for volume in volumes] for name, volumes in self.volumes.items()},
+        }
+
+    @property
+    def file_count(self):
+        return sum(len(archive) for archive in self.archives)
+
+    @property
+    def total_bytes(self):
+        return sum(archive.total_bytes for archive in self.archives)
+
+    @property
+    def missing(self):
+        return [description for archive in self.planned_archives for description in archive.missing]
+
+class JobSummary:
+    """
+    Outcome of a zipping job.
+
+    Args:
+        project_path (str): Path of the project file or directory.
+    """
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.success = False
+        self.archives = []
+        self.file_count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.missing = []
+        self.errors = []
+        self.cancelled = False
+        self.members = {}
+        self.archive_bytes_in = {}
+        self.archive_bytes_out = {}
+        self.phases = {}
+        self.start_time = time.monotonic()
+        self.duration = 0
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure the time of a phase of the job.
+
+        Args:
+            name (str): Name of the phase, times of phases with the same name are added up.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.monotonic() - start
+
+    def set_plan(self, plan):
+        """
+        Take the archives, members and sizes from the plan of the job.
+
+        Args:
+            plan (JobPlan): The plan of the job.
+        """
+        self.archives = [archive.zip_file_name for archive in plan.archives]
+        self.members = {archive.zip_file_name: [entry.arcname for entry in archive] for archive in plan.archives}
+        self.archive_bytes_in = {archive.zip_file_name: archive.total_bytes for archive in plan.archives}
+        self.file_count = plan.file_count
+        self.bytes_in = plan.total_bytes
+        self.missing = plan.missing
+
+    def finish(self):
+        """
+        Stop the job time and read the size of the written archives, streamed archives keep their recorded size.
+        """
+        self.duration = time.monotonic() - self.start_time
+        self.archive_bytes_out.update({archive: os.path.getsize(archive) for archive in self.archives if os.path.exists(archive)})
+        self.bytes_out = sum(self.archive_bytes_out.values())
+
+    def to_dict(self):
+        return {
+            'project': self.project_path,
+            'success': self.success,
+            'archives': self.archives,
+            'files': self.file_count,
+            'duration': round(self.duration, 3),
+            'phases': {name: round(duration, 3) for name, duration in self.phases.items()},
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'missing': self.missing,
+            'errors': self.errors,
+        }
@@ -0,0 +1,243 @@
+import sys
+import time
+import logging
+import threading
+import itertools
+from contextlib import contextmanager
+from collections import deque
+from logging.handlers import MemoryHandler
+
+LOGGER_NAME = 'brpyzip'
+LOG_FORMAT = '%(asctime)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Maximum time a log line waits in the headless output buffer
+FLUSH_INTERVAL = 0.5
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_setup_lock = threading.Lock()
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the last formatted log lines in a bounded buffer.
+
+    Readers remember the position they read up to and fetch only the lines added
+    since then, so the GUI can show new lines in one chunk per frame.
+
+    Args:
+        capacity (int): Maximum number of lines kept in the buffer.
+    """
+    def __init__(self, capacity=100000):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)
+        self.position = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.lines.append(line)
+            self.position += 1
+
+    def lines_since(self, position):
+        """
+        Get the lines added after a position.
+
+        Args:
+            position (int): Position returned by a previous call, 0 for all lines.
+
+        Returns:
+            tuple: (list of new lines, new position)
+        """
+        with self.lock:
+            count = min(self.position - position, len(self.lines))
+            lines = list(itertools.islice(self.lines, len(self.lines) - count, None)) if count > 0 else []
+            return lines, self.position
+
+class BufferedHandler(MemoryHandler):
+    """
+    Passes log records to a target handler in batches.
+
+    The buffer is flushed when it is full, when an error is logged or by a timer
+    FLUSH_INTERVAL after the first line was buffered, so the last lines of a quiet
+    phase are not held back until the next line is logged.
+
+    Args:
+        target (logging.Handler): Handler writing the log lines.
+        capacity (int): Number of records buffered before they are flushed.
+    """
+    def __init__(self, target, capacity=256):
+        target.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+        super().__init__(capacity, flushLevel=logging.ERROR, target=target)
+        self.timer = None
+
+    def shouldFlush(self, record):
+        # Called with the lock of the handler held, after the record was buffered
+        if self.timer is None:
+            self.timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+        return super().shouldFlush(record)
+
+    def flush(self):
+        with self.lock:
+            super().flush()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def close(self):
+        target = self.target
+        super().close()
+        if target is not None:
+            target.close()
+
+class ErrorCollector(logging.Handler):
+    """
+    Collects the error messages logged by one thread and the workers it shares its errors with.
+
+    Args:
+        errors (list): List the messages are appended to.
+    """
+    def __init__(self, errors):
+        super().__init__(logging.ERROR)
+        self.errors = errors
+        self.threads = {threading.get_ident()}
+
+    def emit(self, record):
+        if record.thread in self.threads:
+            self.errors.append(record.getMessage())
+
+class ProjectTag(logging.Filter):
+    """
+    Prefixes the messages of one thread and the workers it shares its errors with by a project name.
+
+    Args:
+        name (str): Name of the project.
+    """
+    def __init__(self, name):
+        super().__init__()
+        self.prefix = f"[{name}] "
+        self.threads = {threading.get_ident()}
+
+    def filter(self, record):
+        if record.thread in self.threads:
+            record.msg = self.prefix + record.getMessage()
+            record.args = None
+        return True
+
+def share_errors(function):
+    """
+    Wrap a function that runs in a worker thread, so the errors it logs are collected
+    like the errors of the calling thread and its messages get the same project tag.
+
+    Args:
+        function (callable): The function run by the worker.
+
+    Returns:
+        callable: The wrapped function.
+    """
+    caller = threading.get_ident()
+    collectors = [handler for handler in logger.handlers if isinstance(handler, ErrorCollector) and caller in handler.threads]
+    collectors += [tag for tag in logger.filters if isinstance(tag, ProjectTag) and caller in tag.threads]
+
+    def wrapper(*args, **kwargs):
+        worker = threading.get_ident()
+        for collector in collectors:
+            collector.threads.add(worker)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            for collector in collectors:
+                collector.threads.discard(worker)
+    return wrapper
+
+@contextmanager
+def capture_errors(errors):
+    """
+    Collect the errors logged by the current thread while the context is active.
+
+    Args:
+        errors (list): List the error messages are appended to.
+    """
+    handler = ErrorCollector(errors)
+    logger.addHandler(handler)
+    try:
+        yield errors
+    finally:
+        logger.removeHandler(handler)
+
+@contextmanager
+def tag_log(name):
+    """
+    Prefix the messages logged by the current thread with a project name while the context is active.
+
+    Used when several projects are zipped at the same time, so their interleaved lines can be told apart.
+
+    Args:
+        name (str): Name of the project.
+    """
+    tag = ProjectTag(name)
+    logger.addFilter(tag)
+    try:
+        yield
+    finally:
+        logger.removeFilter(tag)
+
+def setup_logging(config=None, gui=False, stream=None):
+    """
+    Configure the log output of the application.
+
+    Log lines are always kept in a ring buffer. In headless mode they are also written
+    to stdout, and to the file set in [GENERAL] log_file if it is configured.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+        gui (bool): Running with GUI, no output to stdout.
+        stream (file object): Console stream used instead of stdout, e.g. stderr while the archive goes to stdout.
+
+    Returns:
+        RingBufferHandler: The buffer holding the log lines.
+    """
+    with _setup_lock:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+        capacity = config.getint('GENERAL', 'log_buffer_size', fallback=100000) if config else 100000
+        buffer = RingBufferHandler(capacity)
+        buffer.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+        logger.addHandler(buffer)
+
+        if not gui:
+            logger.addHandler(BufferedHandler(logging.StreamHandler(stream or sys.stdout)))
+
+        log_file = config.get('GENERAL', 'log_file', fallback='') if config else ''
+        if log_file:
+            logger.addHandler(BufferedHandler(logging.FileHandler(log_file, encoding='utf-8')))
+        return buffer
+
+def get_log_buffer():
+    """
+    Get the ring buffer of the log, setting up headless logging if it is not configured yet.
+
+    Returns:
+        RingBufferHandler: The buffer holding the log lines.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, RingBufferHandler):
+            return handler
+    return setup_logging()
+
+def flush_log():
+    """
+    Write all buffered log lines to their outputs.
+    """
+    for handler in logger.handlers:
+        handler.flush()
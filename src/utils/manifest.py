@@ -0,0 +1,77 @@
+import os
+import json
+from datetime import datetime
+from utils.archive_backends import strip_archive_extension
+from utils.file_hashes import hash_file
+
+# Member of an archive with the size, hashes, source and origin of every file
+MANIFEST_NAME = 'MANIFEST.json'
+MANIFEST_VERSION = 1
+
+def manifest_file_name(zip_file_name):
+    # Sidecar of an archive, e.g. Project_Manifest.json next to Project.zip
+    return strip_archive_extension(zip_file_name) + "_Manifest.json"
+
+def build_manifest(archive_plan, hashes, project_file, cache=None):
+    """
+    Create the manifest of an archive from the hashes taken while it was written.
+
+    Files that were not read while the archive was written, e.g. members copied from
+    the previous archive in incremental mode, are taken from the hash cache or hashed.
+    The origin of an upgrade lists the .apj, Cpu.pkg or Hardware.hw entries that require
+    it, project files have no origin.
+
+    Args:
+        archive_plan (ArchivePlan): Plan of the archive.
+        hashes (dict): 'size', 'crc32' and 'sha256' per member name, see ArchiveWriter.hashes.
+        project_file (str): Path of the .apj file of the project.
+        cache (HashCache): Cache the hashes are taken from and stored in, None hashes missing files.
+
+    Returns:
+        dict: The manifest.
+    """
+    files = []
+    for entry in archive_plan:
+        file_hashes = hashes.get(entry.arcname)
+        if file_hashes is None:
+            file_hashes = cache.hash_file(entry.file_path) if cache is not None else hash_file(entry.file_path)
+        elif cache is not None:
+            cache.put(entry.file_path, file_hashes)
+        files.append({
+            'path': entry.arcname.replace(os.sep, '/'),
+            'size': file_hashes['size'],
+            'crc32': file_hashes['crc32'],
+            'sha256': file_hashes['sha256'],
+            'source': os.path.abspath(entry.file_path),
+            'origin': entry.origin,
+        })
+    return {
+        'version': MANIFEST_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'project': os.path.abspath(project_file),
+        'archive': os.path.basename(archive_plan.zip_file_name),
+        'files': files,
+    }
+
+def plan_manifest(archive_plan, project_file, cache=None):
+    """
+    Plan a MANIFEST.json member that is written after all files of the archive.
+
+    The writer of the archive must collect the hashes of the files, see ArchiveWriter.hashes.
+
+    Args:
+        archive_plan (ArchivePlan): Plan of the archive.
+        project_file (str): Path of the .apj file of the project.
+        cache (HashCache): Cache of known hashes, None hashes files that were not read.
+
+    Returns:
+        dict: The manifest, filled in when the member is written.
+    """
+    manifest = {}
+
+    def build(archive):
+        manifest.update(build_manifest(archive_plan, archive.hashes or {}, project_file, cache))
+        return json.dumps(manifest, indent=2).encode('utf-8')
+
+    archive_plan.add_generated(MANIFEST_NAME, build)
+    return manifest
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from collections import Counter
+from utils.upgrade_index import get_cache_dir
+
+CACHE_DIR_NAME = 'members'
+CACHE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+# Get the shared member cache for the configured cache directory
+def get_member_cache(config):
+    """
+    Get the compressed member cache for a configuration.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+
+    Returns:
+        MemberCache: The member cache, None if it is disabled.
+    """
+    if not config.getboolean('CACHE', 'member_cache', fallback=True):
+        return None
+    directory = os.path.join(get_cache_dir(config), CACHE_DIR_NAME)
+    max_size = config.getint('CACHE', 'member_cache_size_mb', fallback=1024) * 1024 * 1024
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = MemberCache(directory, max_size)
+        _caches[directory].max_size = max_size
+        return _caches[directory]
+
+class MemberCache:
+    """
+    Local cache of compressed ZIP member data.
+
+    Files are deflated once into a blob in the cache directory together with their
+    CRC32 and SHA-256, so later runs copy the compressed data into the archive instead of
+    compressing the file again. Entries are keyed on the source path, size and
+    modification time. When the cache grows above its size cap, the least recently
+    used entries are removed. Entries returned by get() and store() are pinned and
+    not removed until they are released, so a blob can not vanish while a writer
+    copies it into an archive.
+
+    Args:
+        directory (str): Directory of the cache.
+        max_size (int): Maximum size of all cached blobs in bytes.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.index_file = os.path.join(directory, 'index.json')
+        self.max_size = max_size
+        self.entries = {}
+        self.pinned = Counter()
+        self.dirty = False
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        Write the cache index if it changed.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            temp_file = self.index_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump({'version': CACHE_VERSION, 'entries': self.entries}, file)
+            os.replace(temp_file, self.index_file)
+            self.dirty = False
+
+    def _key(self, file_path):
+        st = os.stat(file_path)
+        source = f"{os.path.normcase(os.path.abspath(file_path))}\0{st.st_size}\0{st.st_mtime_ns}"
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    def get(self, file_path):
+        """
+        Get the cache entry of a file.
+
+        Args:
+            file_path (str): Path of the source file.
+
+        Returns:
+            dict: The entry with 'key', 'crc', 'sha256', 'file_size' and 'compress_size', None if the file is not cached.
+            Entries of older caches have no 'sha256'. The entry is pinned until it is released with release().
+        """
+        key = self._key(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self._blob_path(key)):
+                del self.entries[key]
+                self.dirty = True
+                return None
+            entry['last_used'] = time.time()
+            self.pinned[key] += 1
+            self.dirty = True
+            return dict(entry, key=key)
+
+    def store(self, file_path):
+        """
+        Deflate a file into the cache.
+
+        Args:
+            file_path (str): Path of the source file.
+
+        Returns:
+            dict: The new entry, see get(), None if the file is larger than the size cap of the cache.
+        """
+        if os.path.getsize(file_path) > self.max_size:
+            return None
+        key = self._key(file_path)
+        os.makedirs(self.directory, exist_ok=True)
+        blob_path = self._blob_path(key)
+        temp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        sha256 = hashlib.sha256()
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        with open(file_path, 'rb') as source, open(temp_path, 'wb') as blob:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                sha256.update(chunk)
+                file_size += len(chunk)
+                data = compressor.compress(chunk)
+                compress_size += len(data)
+                blob.write(data)
+            data = compressor.flush()
+            compress_size += len(data)
+            blob.write(data)
+        os.replace(temp_path, blob_path)
+
+        entry = {'crc': crc, 'sha256': sha256.hexdigest(), 'file_size': file_size, 'compress_size': compress_size, 'last_used': time.time()}
+        with self.lock:
+            self.entries[key] = entry
+            self.pinned[key] += 1
+            self.dirty = True
+            self._evict()
+        return dict(entry, key=key)
+
+    def release(self, entry):
+        """
+        Unpin an entry returned by get() or store() once its data was read.
+
+        Args:
+            entry (dict): The entry.
+        """
+        with self.lock:
+            key = entry['key']
+            self.pinned[key] -= 1
+            if self.pinned[key] <= 0:
+                del self.pinned[key]
+            self._evict()
+
+    def read(self, entry):
+        """
+        Open the compressed data of a cache entry.
+
+        Args:
+            entry (dict): Entry returned by get() or store().
+
+        Returns:
+            generator: Chunks of the raw DEFLATE stream. The blob is opened right away,
+            so a missing blob raises OSError here and not while the chunks are read.
+        """
+        return self._read_blob(open(self._blob_path(entry['key']), 'rb'))
+
+    def _read_blob(self, blob):
+        with blob:
+            while True:
+                chunk = blob.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _evict(self):
+        # Remove the least recently used entries until the cache fits its size cap, pinned entries are kept
+        total = sum(entry['compress_size'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_size:
+                break
+            if key in self.pinned:
+                continue
+            total -= self.entries.pop(key)['compress_size']
+            try:
+                os.remove(self._blob_path(key))
+            except OSError:
+                pass
@@ -0,0 +1,150 @@
+import os
+import re
+from collections import namedtuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.encoding import read_text
+from utils.hardware_reader import iter_hardware_modules, iter_external_modules
+
+CPU_TYPE = re.compile(r'Configuration ModuleId="([^"]+)"')
+RUNTIME_VERSION = re.compile(r'AutomationRuntime Version="([^"]+)"')
+VC_VERSION = re.compile(r'Vc FirmwareVersion="([^"]+)"')
+
+# Fewer configurations are scanned in this process, spawning the workers takes longer than scanning them
+PROCESS_MIN_CONFIGURATIONS = 8
+
+# Everything found in one configuration of the Physical folder
+ConfigScan = namedtuple('ConfigScan', ['folder_path', 'cpu_file', 'cpu_type', 'runtime_version', 'vc_version', 'modules', 'external_modules'])
+
+def scan_configuration(folder_path, include_runtime=True, include_hardware=True):
+    """
+    Read the CPU, hardware and external hardware files of one configuration.
+
+    Args:
+        folder_path (str): Path of the configuration folder in Physical.
+        include_runtime (bool): Read the runtime and VC versions from Cpu.pkg.
+        include_hardware (bool): Read the modules from Hardware.hw and ExternalHardwareDevices.xml.
+
+    Returns:
+        ConfigScan: The path of the Cpu.pkg that was read, the CPU type and versions as found in the files, None if they are missing,
+        the (type, version) of all modules and the (ModuleID, version, original file) of all
+        external modules.
+    """
+    cpu_file = cpu_type = runtime_version = vc_version = None
+    modules = []
+    external_modules = []
+
+    plc_folders = [name for name in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, name))]
+
+    if include_runtime and plc_folders:
+        cpu_file = os.path.join(folder_path, plc_folders[0], 'Cpu.pkg')
+        content = read_text(cpu_file).replace('\n', '')
+        match = CPU_TYPE.search(content)
+        if match:
+            cpu_type = match.group(1)
+            match = RUNTIME_VERSION.search(content)
+            runtime_version = match.group(1) if match else None
+            match = VC_VERSION.search(content)
+            vc_version = match.group(1) if match else None
+
+    if include_hardware:
+        for plc_folder in plc_folders:
+            external_file = os.path.join(folder_path, plc_folder, 'ExternalHardware', 'ExternalHardwareDevices.xml')
+            if os.path.exists(external_file):
+                external_modules.extend(iter_external_modules(external_file))
+
+        hardware_file = os.path.join(folder_path, 'Hardware.hw')
+        if os.path.exists(hardware_file):
+            modules.extend(iter_hardware_modules(hardware_file))
+        else:
+            modules = None
+
+    return ConfigScan(folder_path, cpu_file, cpu_type, runtime_version, vc_version, modules, external_modules)
+
+def scan_physical(physical_path, jobs=1, include_runtime=True, include_hardware=True):
+    """
+    Scan all configurations of a Physical folder concurrently.
+
+    Parsing is CPU bound Python code, so with more than one job and at least
+    PROCESS_MIN_CONFIGURATIONS configurations they are scanned in worker processes to
+    use several cores. The processes are spawned, not forked, because the job may run
+    next to other threads, e.g. in batch mode. Spawning re-imports the __main__ module
+    of the caller, so library callers need a main guard to use more than one job.
+
+    Args:
+        physical_path (str): Path of the Physical folder.
+        jobs (int): Number of worker processes, 1 scans in this process.
+        include_runtime (bool): Read the runtime and VC versions.
+        include_hardware (bool): Read the hardware modules.
+
+    Yields:
+        ConfigScan: The result of each configuration, in the order of the folder listing.
+        Errors of a configuration are raised when its result is reached.
+    """
+    folders = [os.path.join(physical_path, name) for name in os.listdir(physical_path)]
+    folders = [folder for folder in folders if os.path.isdir(folder)]
+    if jobs <= 1 or len(folders) < PROCESS_MIN_CONFIGURATIONS:
+        for folder in folders:
+            yield scan_configuration(folder, include_runtime, include_hardware)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(folders)), mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(scan_configuration, folder, include_runtime, include_hardware) for folder in folders]
+        try:
+            for index, future in enumerate(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # Workers can not start, e.g. when the caller has no main guard, scan the rest here
+                    for folder in folders[index:]:
+                        yield scan_configuration(folder, include_runtime, include_hardware)
+                    return
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
+
+class UpgradeArtifacts:
+    """
+    Deduplicated set of the upgrade files required by the configurations.
+
+    Files keep the order they were first added in, so the archive layout does not
+    depend on how many configurations use the same upgrade. The project entries that
+    require a file are collected as its origin.
+    """
+    def __init__(self):
+        self.files = {}
+        self.origins = {}
+
+    def __iter__(self):
+        # Yields (kind, file name, path inside the archive, origin)
+        for key, kind in self.files.items():
+            yield kind, key[0], key[1], self.origins[key]
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, kind, file_name, zip_path='Upgrades', origin=()):
+        """
+        Add a required upgrade file.
+
+        Args:
+            kind (str): Kind of the upgrade, e.g. 'runtime', 'vc', 'firmware' or 'external'.
+            file_name (str): Path of the upgrade file.
+            zip_path (str): Directory of the file inside the archive.
+            origin (iterable): Project entries that require the file, e.g. 'Physical/Config1/Hardware.hw: X20DI9371 1.1.0.0'.
+
+        Returns:
+            bool: True if the file was not in the set yet.
+        """
+        key = (file_name, zip_path)
+        origins = self.origins.setdefault(key, [])
+        origins.extend(item for item in origin if item not in origins)
+        if key in self.files:
+            return False
+        self.files[key] = kind
+        return True
+
+    def count(self, kind):
+        return sum(1 for value in self.files.values() if value == kind)
@@ -0,0 +1,235 @@
+import io
+import os
+import sys
+import json
+import time
+import builtins
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# Phase that collects everything measured outside of a named phase
+OTHER_PHASE = 'other'
+
+# File system functions counted while profiling, os.path functions use them internally
+FS_FUNCTIONS = ['stat', 'lstat', 'listdir', 'scandir', 'mkdir', 'remove', 'replace', 'rename']
+
+_active = None
+# Held while a profiler is active, profiled jobs of other threads wait for it
+_active_lock = threading.Lock()
+
+@contextmanager
+def profile_phase(name):
+    """
+    Measure a phase of the job if profiling is active, otherwise do nothing.
+
+    Args:
+        name (str): Name of the phase.
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    with profiler.phase(name):
+        yield
+
+class PhaseMetrics:
+    """
+    Counters of one phase.
+    """
+    def __init__(self):
+        self.wall_time = 0.0
+        self.calls = 0
+        self.fs_calls = 0
+        self.files = set()
+        self.bytes_read = 0
+        self.written = set()
+        self.bytes_written = 0
+
+    def to_dict(self):
+        return {
+            'wall_time': round(self.wall_time, 6),
+            'calls': self.calls,
+            'files': len(self.files),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'fs_calls': self.fs_calls,
+        }
+
+class Profiler:
+    """
+    Collects wall time, opened files, bytes read and written and file system calls per phase.
+
+    While the profiler is active, the file system functions of os and open() are wrapped
+    to count their calls. Calls from any thread are counted for the innermost phase that
+    is running, so only one profiler is active at a time: a profiler that is entered
+    while another one runs waits until that one is finished. Bytes read are the sizes of the files opened for reading, bytes written
+    the sizes of the files opened for writing at the end of the phase. Optionally the
+    thread that runs the job is profiled with cProfile.
+
+    Args:
+        pstats (bool): Also collect cProfile statistics.
+    """
+    def __init__(self, pstats=False):
+        self.phases = {}
+        self.stack = []
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.originals = {}
+        self.profile = None
+        self.pstats = pstats
+        self.start_time = None
+        self.wall_time = 0.0
+
+    def __enter__(self):
+        global _active
+        _active_lock.acquire()
+        try:
+            self._patch()
+        except BaseException:
+            _active_lock.release()
+            raise
+        _active = self
+        self.enabled = True
+        if self.pstats:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start_time = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        if not self.enabled:
+            return False
+        try:
+            self.wall_time = time.monotonic() - self.start_time
+            if self.profile is not None:
+                self.profile.disable()
+            self._unpatch()
+            other = self._metrics(OTHER_PHASE)
+            other.wall_time = max(0.0, self.wall_time - sum(metrics.wall_time for name, metrics in self.phases.items() if name != OTHER_PHASE))
+            self._measure_written(other)
+        finally:
+            _active = None
+            self.enabled = False
+            _active_lock.release()
+        return False
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure a phase, nested phases are counted for the inner phase only.
+
+        Args:
+            name (str): Name of the phase, calls with the same name are added up.
+        """
+        with self.lock:
+            metrics = self._metrics(name)
+            metrics.calls += 1
+            self.stack.append(name)
+        start = time.monotonic()
+        try:
+            yield metrics
+        finally:
+            elapsed = time.monotonic() - start
+            with self.lock:
+                self.stack.remove(name)
+                metrics.wall_time += elapsed
+            self._measure_written(metrics)
+
+    def _metrics(self, name):
+        if name not in self.phases:
+            self.phases[name] = PhaseMetrics()
+        return self.phases[name]
+
+    def _current(self):
+        return self._metrics(self.stack[-1] if self.stack else OTHER_PHASE)
+
+    def _measure_written(self, metrics):
+        # Add the size of the files written in the phase
+        with self.lock:
+            written, metrics.written = metrics.written, set()
+        stat = self.originals.get('stat', os.stat)
+        for path in written:
+            try:
+                metrics.bytes_written += stat(path).st_size
+            except OSError:
+                pass
+
+    def _patch(self):
+        for name in FS_FUNCTIONS:
+            self.originals[name] = getattr(os, name)
+            setattr(os, name, self._counted(self.originals[name]))
+        self.originals['open'] = builtins.open
+        self.originals['io_open'] = io.open
+        builtins.open = io.open = self._open
+
+    def _unpatch(self):
+        for name in FS_FUNCTIONS:
+            setattr(os, name, self.originals[name])
+        builtins.open = self.originals['open']
+        io.open = self.originals['io_open']
+
+    def _counted(self, function):
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                self._current().fs_calls += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _open(self, file, mode='r', *args, **kwargs):
+        handle = self.originals['open'](file, mode, *args, **kwargs)
+        writing = any(flag in mode for flag in 'wax+')
+        size = 0
+        if not writing:
+            try:
+                size = os.fstat(handle.fileno()).st_size
+            except (OSError, AttributeError, ValueError):
+                pass
+        with self.lock:
+            metrics = self._current()
+            metrics.fs_calls += 1
+            if writing:
+                if isinstance(file, (str, bytes, os.PathLike)):
+                    metrics.written.add(os.fspath(file))
+            else:
+                metrics.files.add(file if isinstance(file, (str, bytes, int)) else os.fspath(file))
+                metrics.bytes_read += size
+        return handle
+
+    def to_dict(self, **extra):
+        """
+        Get the metrics as a JSON compatible dictionary.
+
+        Args:
+            **extra: Additional values stored in the 'job' entry.
+
+        Returns:
+            dict: Time stamp, platform, total wall time, the job values and the metrics per phase.
+        """
+        import platform
+        with self.lock:
+            phases = {name: metrics.to_dict() for name, metrics in self.phases.items()}
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'wall_time': round(self.wall_time, 6),
+            'job': extra,
+            'phases': phases,
+        }
+
+    def save(self, metrics_file, pstats_file=None, **extra):
+        """
+        Write the metrics as JSON and the cProfile statistics if they were collected.
+
+        Args:
+            metrics_file (str): Path of the JSON file.
+            pstats_file (str): Path of the pstats file, None to skip it.
+            **extra: Additional values stored in the 'job' entry.
+        """
+        with open(metrics_file, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(**extra), file, indent=2)
+        if pstats_file and self.profile is not None:
+            self.profile.dump_stats(pstats_file)
@@ -0,0 +1,95 @@
+import time
+import threading
+
+# Format a byte count for the log
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} {unit}"
+        size /= 1024
+
+# Parse a byte count like '2G', '500 MB' or '1048576', units are powers of 1024
+def parse_size(text):
+    text = str(text).strip().upper().replace(' ', '')
+    if text.endswith('B'):
+        text = text[:-1]
+    factor = 1
+    if text and text[-1] in 'KMGT':
+        factor = 1024 ** ('KMGT'.index(text[-1]) + 1)
+        text = text[:-1]
+    try:
+        return int(float(text or 0) * factor)
+    except ValueError:
+        raise ValueError(f"Invalid size '{text}', use a number of bytes or a value like '500M' or '2G'")
+
+# Format a duration in seconds as h:mm:ss
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class ProgressTracker:
+    """
+    Tracks the compression progress in bytes and calculates throughput and ETA.
+
+    Args:
+        total_bytes (int): Number of bytes of all planned files.
+        report (callable): Called with (percent, status text), at most once per interval.
+        interval (float): Minimum time between two reports in seconds.
+    """
+    def __init__(self, total_bytes, report, interval=0.1):
+        self.total_bytes = total_bytes
+        self.report = report
+        self.interval = interval
+        self.done_bytes = 0
+        self.start_time = time.monotonic()
+        self.last_report = 0
+        self.lock = threading.Lock()
+
+    def advance(self, size):
+        """
+        Add processed bytes, can be called from any thread.
+
+        Args:
+            size (int): Number of bytes processed.
+        """
+        with self.lock:
+            self.done_bytes += size
+            now = time.monotonic()
+            if now - self.last_report < self.interval:
+                return
+            self.last_report = now
+        self.report(self.percent, self.status())
+
+    @property
+    def percent(self):
+        if self.total_bytes <= 0:
+            return 100
+        return min(100, self.done_bytes * 100 / self.total_bytes)
+
+    @property
+    def rate(self):
+        # Throughput in bytes per second
+        elapsed = time.monotonic() - self.start_time
+        return self.done_bytes / elapsed if elapsed > 0 else 0
+
+    @property
+    def eta(self):
+        # Remaining time in seconds, None while the rate is unknown
+        rate = self.rate
+        if rate <= 0:
+            return None
+        return max(0, self.total_bytes - self.done_bytes) / rate
+
+    def status(self):
+        """
+        Get the progress as text, e.g. '45% 120.0 MB of 260.0 MB, 35.2 MB/s, ETA 0:00:04'.
+        """
+        eta = self.eta
+        return (f"{self.percent:.0f}% {format_size(self.done_bytes)} of {format_size(self.total_bytes)}, "
+                f"{self.rate / 1024 / 1024:.1f} MB/s, ETA {format_duration(eta) if eta is not None else '-'}")
+
+    def finish(self):
+        """
+        Report the final progress.
+        """
+        self.report(100, f"{format_size(self.done_bytes)} in {format_duration(time.monotonic() - self.start_time)}, {self.rate / 1024 / 1024:.1f} MB/s")
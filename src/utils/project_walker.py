@@ -0,0 +1,228 @@
+import os
+import re
+from collections import namedtuple
+from utils.compression_policy import split_list
+
+# File in the project directory with additional exclusion rules, one glob pattern per line
+IGNORE_FILE = '.brpyzipignore'
+
+# A project file found by the walker, arcname uses '/' as separator
+ProjectFile = namedtuple('ProjectFile', ['file_path', 'arcname', 'size'])
+
+def translate_glob(pattern):
+    """
+    Translate a glob pattern into a regular expression for '/' separated relative paths.
+
+    '*' and '?' do not match '/', '**' matches any number of folders. A pattern
+    without '/' matches the name in every folder, a pattern with '/' is anchored
+    at the project directory.
+
+    Args:
+        pattern (str): Glob pattern without a trailing '/'.
+
+    Returns:
+        str: The regular expression.
+    """
+    pattern = pattern.replace('\\', '/')
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    result = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith('**/', index):
+            result.append('(?:.*/)?')
+            index += 3
+            continue
+        if pattern.startswith('**', index):
+            result.append('.*')
+            index += 2
+            continue
+        if char == '*':
+            result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '[' and ']' in pattern[index + 2:]:
+            end = pattern.index(']', index + 2)
+            content = pattern[index + 1:end]
+            if content.startswith('!'):
+                content = '^' + content[1:]
+            result.append('[' + content.replace('\\', '\\\\') + ']')
+            index = end
+        else:
+            result.append(re.escape(char))
+        index += 1
+    return ('' if anchored else '(?:.*/)?') + ''.join(result)
+
+class PathMatcher:
+    """
+    Decides which project files and folders are left out of the archive.
+
+    All patterns are compiled once into two regular expressions. A path is excluded
+    when it matches an exclude pattern and no include pattern. Patterns ending with
+    '/' only match folders. An excluded folder is skipped with its whole subtree, so
+    include patterns can not bring back files below it.
+
+    Args:
+        exclude (iterable): Glob patterns of excluded files and folders.
+        include (iterable): Glob patterns of files and folders that are kept although they match an exclude pattern.
+    """
+    def __init__(self, exclude=(), include=()):
+        self.exclude = list(exclude)
+        self.include = list(include)
+        self.exclude_dirs, self.exclude_files = self._compile(self.exclude)
+        self.include_dirs, self.include_files = self._compile(self.include)
+
+    @staticmethod
+    def _compile(patterns):
+        # Folder patterns match folders only, all others match files and folders
+        dirs = []
+        files = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+            if pattern.endswith(('/', '\\')):
+                dirs.append(translate_glob(pattern.rstrip('/\\')))
+            else:
+                regex = translate_glob(pattern)
+                dirs.append(regex)
+                files.append(regex)
+        compile_any = lambda regexes: re.compile('(?:' + '|'.join(regexes) + r')\Z', re.IGNORECASE) if regexes else None
+        return compile_any(dirs), compile_any(files)
+
+    @classmethod
+    def from_config(cls, config, project_dir=None):
+        """
+        Create the matcher from the folder settings of [GENERAL], the [EXCLUDE] section
+        and the ignore file of the project.
+
+        Args:
+            config (configparser.ConfigParser): Loaded configuration.
+            project_dir (str): Project directory with an optional .brpyzipignore file.
+
+        Returns:
+            PathMatcher: The matcher.
+        """
+        exclude = []
+        if not config.getboolean('GENERAL', 'include_binary_folder', fallback=False):
+            exclude.append('Binaries/')
+        if not config.getboolean('GENERAL', 'include_diag_folder', fallback=False):
+            exclude.append('Diagnosis/')
+        if not config.getboolean('GENERAL', 'include_temp_folder', fallback=False):
+            exclude.append('Temp/')
+        if not config.getboolean('GENERAL', 'include_dot_folder', fallback=config.getboolean('GENERAL', 'include_dot', fallback=False)):
+            exclude.append('.*/')
+        exclude += split_list(config.get('EXCLUDE', 'patterns', fallback=''))
+        include = split_list(config.get('EXCLUDE', 'include', fallback=''))
+        if project_dir:
+            ignore_exclude, ignore_include = read_ignore_file(os.path.join(project_dir, IGNORE_FILE))
+            exclude += ignore_exclude
+            include += ignore_include
+        return cls(exclude, include)
+
+    def excludes_dir(self, arcname):
+        """
+        Check if a folder is skipped.
+
+        Args:
+            arcname (str): '/' separated path of the folder relative to the project directory.
+
+        Returns:
+            bool: True if the folder and everything below it is skipped.
+        """
+        return bool(self.exclude_dirs and self.exclude_dirs.match(arcname)
+                    and not (self.include_dirs and self.include_dirs.match(arcname)))
+
+    def excludes_file(self, arcname):
+        """
+        Check if a file is skipped.
+
+        Args:
+            arcname (str): '/' separated path of the file relative to the project directory.
+
+        Returns:
+            bool: True if the file is skipped.
+        """
+        return bool(self.exclude_files and self.exclude_files.match(arcname)
+                    and not (self.include_files and self.include_files.match(arcname)))
+
+def read_ignore_file(path):
+    """
+    Read an ignore file, one glob pattern per line.
+
+    Empty lines and lines starting with '#' are skipped, patterns starting with '!'
+    are include patterns.
+
+    Args:
+        path (str): Path of the ignore file.
+
+    Returns:
+        tuple: (exclude patterns, include patterns), both empty if the file does not exist.
+    """
+    exclude = []
+    include = []
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        return exclude, include
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('!'):
+            include.append(line[1:])
+        else:
+            exclude.append(line)
+    return exclude, include
+
+def walk_project(project_dir, matcher, cancelled=None, on_skip=None):
+    """
+    Find the project files with os.scandir, folders are walked top down like os.walk.
+
+    The files of a folder are yielded before its subfolders. Excluded folders are not
+    opened at all. The sizes come from the directory entries, which on Windows needs
+    no extra system call. Symbolic links to folders are not followed.
+
+    Args:
+        project_dir (str): Project directory.
+        matcher (PathMatcher): Decides which files and folders are skipped.
+        cancelled (callable): Returns True to stop the walk.
+        on_skip (callable): Called with the arcname of every skipped folder.
+
+    Yields:
+        ProjectFile: Path, archive name and size of every included file.
+    """
+    stack = [(project_dir, '')]
+    while stack:
+        if cancelled and cancelled():
+            return
+        path, prefix = stack.pop()
+        try:
+            with os.scandir(path) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+        folders = []
+        for entry in entries:
+            arcname = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if matcher.excludes_dir(arcname):
+                    if on_skip:
+                        on_skip(arcname)
+                elif not entry.is_symlink():
+                    folders.append((entry.path, arcname + '/'))
+                continue
+            if matcher.excludes_file(arcname):
+                continue
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            yield ProjectFile(entry.path, arcname, size)
+        stack.extend(reversed(folders))
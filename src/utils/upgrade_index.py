@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import fnmatch
+import threading
+
+CACHE_FILE_NAME = 'upgrade_index.json'
+CACHE_VERSION = 1
+
+# File name formats of the upgrades in the AS Upgrades directory
+TECHNOLOGY_NAME = re.compile(r'^AS(?P<major>\d+)_TP_(?P<name>.+)_(?P<version>[^_]+)\.EXE$')
+SERVICE_PACK_NAME = re.compile(r'^AS(?P<major>\d+)_AS_(?P<version>.+)\.EXE$')
+RUNTIME_NAME = re.compile(r'(?:^|_)AR_(?P<version>[^_]+)_(?P<cpu>[^_]+)\.EXE$')
+VC_NAME = re.compile(r'(?:^|_)VC_(?P<version>[^_]+)\.EXE$')
+
+# Get the default cache directory of the current user
+def default_cache_dir():
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'BrPyZip')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'brpyzip')
+
+# Get the cache directory from the configuration
+def get_cache_dir(config):
+    return config.get('CACHE', 'directory', fallback='') or default_cache_dir()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Get the shared upgrade index for the configured cache file
+def get_upgrade_index(config):
+    """
+    Get the upgrade index for a configuration.
+
+    Indexes are shared per cache file, so several jobs in the same process reuse
+    the directory listings that were already loaded.
+
+    Args:
+        config (configparser.ConfigParser): Loaded configuration.
+
+    Returns:
+        UpgradeIndex: The upgrade index.
+    """
+    cache_file = None
+    if config.getboolean('CACHE', 'upgrade_index', fallback=True):
+        cache_file = os.path.join(get_cache_dir(config), CACHE_FILE_NAME)
+    with _indexes_lock:
+        if cache_file not in _indexes:
+            _indexes[cache_file] = UpgradeIndex(cache_file)
+        return _indexes[cache_file]
+
+class UpgradeIndex:
+    """
+    Index of the upgrade files in the Automation Studio installation directories.
+
+    Directory listings are read once and kept in memory together with the directory
+    modification time. A listing is only read again when the modification time of the
+    directory changed. With a cache file the listings are persisted between runs.
+    File names are parsed into lookup keys, so a lookup is a dictionary access instead
+    of a glob. Names that do not parse fall back to a case insensitive pattern match on
+    the cached listing, which behaves like the glob patterns used before.
+
+    Args:
+        cache_file (str): Path of the cache file, None keeps the index in memory only.
+    """
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.directories = {}
+        self.validated = set()
+        self.keys = {}
+        self.dirty = False
+        self.lock = threading.RLock()
+        if cache_file:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == CACHE_VERSION:
+                self.directories = data.get('directories', {})
+        except (OSError, ValueError):
+            self.directories = {}
+
+    def save(self):
+        """
+        Write the cache file if any directory listing changed.
+        """
+        with self.lock:
+            if not self.cache_file or not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            temp_file = self.cache_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump({'version': CACHE_VERSION, 'directories': self.directories}, file)
+            os.replace(temp_file, self.cache_file)
+            self.dirty = False
+
+    def refresh(self):
+        """
+        Check the modification time of every directory again on its next lookup.
+        """
+        with self.lock:
+            self.validated.clear()
+
+    def listing(self, path):
+        """
+        Get the cached listing of a directory.
+
+        Args:
+            path (str): Path of the directory.
+
+        Returns:
+            dict: {'files': [...], 'dirs': [...]} or None if the directory does not exist.
+        """
+        key = os.path.normcase(os.path.abspath(path))
+        with self.lock:
+            if key in self.validated:
+                return self.directories.get(key)
+            self.validated.add(key)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                if self.directories.pop(key, None) is not None:
+                    self.dirty = True
+                return None
+            entry = self.directories.get(key)
+            if entry is None or entry['mtime'] != mtime:
+                try:
+                    files, dirs = [], []
+                    with os.scandir(path) as entries:
+                        for dir_entry in entries:
+                            (dirs if dir_entry.is_dir() else files).append(dir_entry.name)
+                except NotADirectoryError:
+                    return None
+                entry = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(dirs)}
+                self.directories[key] = entry
+                self.keys.pop(key, None)
+                self.dirty = True
+            return entry
+
+    def _keys(self, path):
+        # Parse all file names of a directory into lookup keys
+        key = os.path.normcase(os.path.abspath(path))
+        entry = self.listing(path)
+        if entry is None:
+            return None, {}
+        with self.lock:
+            if key not in self.keys:
+                keys = {}
+                for name in entry['files']:
+                    upper = name.upper()
+                    keys.setdefault(('FILE', upper), name)
+                    for kind, pattern in (('TP', TECHNOLOGY_NAME), ('AS', SERVICE_PACK_NAME), ('AR', RUNTIME_NAME), ('VC', VC_NAME)):
+                        match = pattern.search(upper)
+                        if match:
+                            keys.setdefault((kind,) + match.groups(), name)
+                self.keys[key] = keys
+            return entry, self.keys[key]
+
+    def _find(self, path, key, pattern):
+        # Look up a parsed key and fall back to the glob pattern
+        entry, keys = self._keys(path)
+        if entry is None:
+            return None
+        name = keys.get(key)
+        if name is None:
+            matcher = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+            name = next((name for name in entry['files'] if matcher.match(name)), None)
+            if name is None:
+                return None
+            with self.lock:
+                keys[key] = name
+        return os.path.join(path, name)
+
+    def find_technology(self, as_path, as_major, name, version):
+        """
+        Find the upgrade of a technology package, like AS4_TP_mappServices_5.24.1.exe.
+        """
+        return self._find(os.path.join(as_path, 'Upgrades'), ('TP', str(as_major), name.upper(), version.upper()), f"AS{as_major}_TP_{name}_{version}*.exe")
+
+    def find_service_pack(self, as_path, as_major, sp_version):
+        """
+        Find the upgrade of an Automation Studio service pack.
+        """
+        return self._find(os.path.join(as_path, 'Upgrades'), ('AS', str(as_major), sp_version.upper()), f"AS{as_major}_AS_{sp_version}*.exe")
+
+    def find_runtime(self, as_base_path, runtime_version, cpu_type):
+        """
+        Find the Automation Runtime upgrade for a runtime version and CPU type.
+        """
+        return self._find(os.path.join(as_base_path, 'Upgrades'), ('AR', runtime_version.upper(), cpu_type.upper()), f"*AR_{runtime_version}_{cpu_type}*.exe")
+
+    def find_vc(self, as_path, vc_version):
+        """
+        Find the Visual Components firmware upgrade.
+        """
+        return self._find(os.path.join(as_path, 'Upgrades'), ('VC', vc_version.upper()), f"*VC_{vc_version}*.exe")
+
+    def find_firmware(self, as_path, module_type, module_version):
+        """
+        Find the firmware upgrade of a hardware module in Upgrades/<type>/<version>.
+        """
+        return self._find(os.path.join(as_path, 'Upgrades', module_type, module_version), ('FIRMWARE',), "*.exe")
+
+    def find_external(self, modules_path, module_id, module_version, original_file):
+        """
+        Find the source file of an external hardware module in <id>/<version>/Source.
+        """
+        return self._find(os.path.join(modules_path, module_id, module_version, 'Source'), ('FILE', original_file.upper()), original_file)
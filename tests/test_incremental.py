@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic_project import generate_project
+from utils.api import ArchiveOptions, archive_project
+
+def test_incremental_crc_without_manifest(tmp_path):
+    project = generate_project(str(tmp_path), technology_packages=1, configurations=1, modules=4, module_types=2,
+                               external_modules=0, logical_files=20, logical_file_size=2048, binary_files=0)
+    options = ArchiveOptions(as_paths=project.as_paths, translate=project.translate,
+                             cache_directory=str(tmp_path / 'cache'), incremental=True, incremental_crc=True)
+    first = archive_project(project.project_dir, options)
+    assert first.success
+
+    # Change one file after the ZIP timestamp resolution of two seconds
+    time.sleep(2)
+    changed = next(os.path.join(root, name) for root, _, names in os.walk(os.path.join(project.project_dir, 'Logical')) for name in names)
+    with open(changed, 'a', encoding='utf-8') as file:
+        file.write('\n(* changed *)\n')
+
+    second = archive_project(project.project_dir, options)
+    assert second.success, second.errors
+    assert sorted(second.members) == sorted(first.members)
+    with zipfile.ZipFile(second.archives[0].path) as zipf:
+        assert zipf.testzip() is None